@@ -0,0 +1,388 @@
+"""Бенчмарки горячих путей планировщика на синтетической нагрузке.
+
+Для каждого размера нагрузки (число машин в очередях) измеряются
+задержка одного вызова ``start_unload``/``start_load``, расчет
+приоритета, стоимость одного тика таймера, сохранение состояния и
+обновление диаграммы Ганта, импорт манифестов прибытия и холодный
+запуск окна, а также пиковая память каждого случая. Результаты пишутся в JSON, чтобы сравнивать версии между собой.
+
+    python benchmark.py --sizes 1000 100000 1000000 --output bench.json
+    python benchmark.py --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from handling_rates import HandlingRates
+from journal import Journal
+from lookahead import LookaheadPolicy
+from manifest_import import import_manifest
+from queue_columns import np
+from simulation import CrossDockSimulation
+from workload import ITEMS, generate_history, generate_queues, write_manifest, write_workload
+
+START_TIME = 1_700_000_000
+SAMPLES = 10000  # больше вызовов на случай не измеряется, размер задает глубину очередей
+SAVE_SAMPLES = 20
+GANTT_BATCH = 10
+GANTT_SAMPLES = 200
+RANK_SAMPLES = 20
+RANK_TOP = 10
+IMPORT_CHUNK = 1000
+STARTUP_SAMPLES = 5
+# Запускается в новом интерпретаторе; печатает секунды от запуска процесса до готовности.
+STARTUP_SCRIPT = """
+import sys, time
+sys.path.insert(0, sys.argv[3])
+import main
+if sys.argv[2] == "window":
+    app = main.CrossDockApp(show_gantt=False)
+    app.update()
+    print(time.time() - float(sys.argv[1]))
+    app.on_close()
+else:
+    print(time.time() - float(sys.argv[1]))
+"""
+STOCK = 10 ** 9
+
+CASES = {}
+
+
+def case(name):
+    def register(function):
+        CASES[name] = function
+        return function
+    return register
+
+
+def make_simulation(size, seed, stocked=True):
+    unload, load = generate_queues(seed, size, start=START_TIME)
+    simulation = CrossDockSimulation(now=START_TIME + size)
+    simulation.unload_queue.extend(unload)
+    simulation.load_queue.extend(load)
+    simulation.unload_times = HandlingRates((item, index + 1) for index, item in enumerate(ITEMS))
+    simulation.load_times = HandlingRates((item, len(ITEMS) - index) for index, item in enumerate(ITEMS))
+    if stocked:
+        simulation.warehouse = {item: (START_TIME, STOCK) for item in ITEMS}
+    return simulation
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+"""Случаи; каждый возвращает список длительностей одного вызова в секундах"""
+@case("start_unload")
+def bench_start_unload(size, seed):
+    simulation = make_simulation(size, seed)
+    door = simulation.unload_doors[0]
+    samples = []
+    for _ in range(min(size, SAMPLES)):
+        elapsed, started = timed(simulation.start_unload)
+        if not started:
+            break
+        samples.append(elapsed)
+        # Пост сразу освобождается, чтобы следующий вызов снова выбирал машину
+        simulation.complete_unload(door)
+        simulation.events.clear()
+    return samples
+
+
+@case("start_load")
+def bench_start_load(size, seed):
+    simulation = make_simulation(size, seed)
+    door = simulation.load_doors[0]
+    samples = []
+    for _ in range(min(size, SAMPLES)):
+        elapsed, started = timed(simulation.start_load)
+        if not started:
+            break
+        samples.append(elapsed)
+        simulation.complete_load(door)
+        simulation.events.clear()
+    return samples
+
+
+@case("calculate_priority")
+def bench_calculate_priority(size, seed):
+    simulation = make_simulation(size, seed)
+    samples = []
+    for task_type, queue in (("unload", simulation.unload_queue), ("load", simulation.load_queue)):
+        for index, task in enumerate(queue):
+            if index >= SAMPLES // 2:
+                break
+            samples.append(timed(simulation.calculate_priority, task, task_type)[0])
+    return samples
+
+
+# Полное ранжирование очереди по calculate_priority, как раньше через list.sort.
+@case("rank_sort")
+def bench_rank_sort(size, seed):
+    simulation = make_simulation(size, seed)
+    queue = list(simulation.unload_queue)
+
+    def rank():
+        return sorted(queue, key=lambda task: -simulation.calculate_priority(task, "unload"))[:RANK_TOP]
+
+    return [timed(rank)[0] for _ in range(RANK_SAMPLES)]
+
+
+# Лучшие RANK_TOP машин одним проходом NumPy по колоночной копии очереди.
+@case("rank_top_k")
+def bench_rank_top_k(size, seed):
+    simulation = make_simulation(size, seed)
+    if np is None:
+        return None
+    simulation.top_candidates("unload", RANK_TOP)
+    return [timed(simulation.top_candidates, "unload", RANK_TOP)[0] for _ in range(RANK_SAMPLES)]
+
+
+# Решение планировщика с упреждением для свободного поста разгрузки.
+@case("lookahead_choose")
+def bench_lookahead_choose(size, seed):
+    simulation = make_simulation(size, seed)
+    policy = LookaheadPolicy()
+    return [timed(policy.choose, simulation, "unload")[0] for _ in range(RANK_SAMPLES)]
+
+
+# Тик таймера окна: сдвиг часов на секунду и распределение машин по постам.
+@case("tick")
+def bench_tick(size, seed):
+    simulation = make_simulation(size, seed, stocked=False)
+    now = simulation.now
+    simulation.dispatch()
+    samples = []
+    for _ in range(SAMPLES):
+        if not simulation.events:
+            break
+        now += 1
+        samples.append(timed(simulation.advance_to, now)[0])
+    return samples
+
+
+@case("save_data")
+def bench_save_data(size, seed):
+    simulation = make_simulation(size, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        files = [os.path.join(directory, name) for name in ("u.txt", "l.txt", "w.txt", "ut.txt", "lt.txt")]
+        return [timed(simulation.save_data, *files)[0] for _ in range(SAVE_SAMPLES)]
+
+
+# Запись изменения очереди в журнал (то, что окно делает вместо save_data).
+@case("journal_append")
+def bench_journal_append(size, seed):
+    simulation = make_simulation(size, seed)
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal(os.path.join(directory, "journal.txt"), os.path.join(directory, "snapshot.txt"))
+        journal.attach(simulation)
+        samples = []
+        for number in range(min(size, SAMPLES)):
+            car_data = (f"J{number:07d}", simulation.now, rng.choice(ITEMS), rng.randint(1, 30))
+            samples.append(timed(simulation.add_to_unload, car_data)[0])
+        journal.close()
+    return samples
+
+
+@case("update_gantt_chart")
+def bench_update_gantt_chart(size, seed):
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+    except ImportError:
+        return None
+    from gantt import AxesTarget, GanttChart
+    from history_log import HistoryReader
+
+    figure = Figure(figsize=(12, 8))
+    reader = HistoryReader()
+    chart = GanttChart(AxesTarget(figure.add_subplot(), FigureCanvasAgg(figure)), reader=reader)
+    records = generate_history(seed, size + GANTT_BATCH * GANTT_SAMPLES, unload_doors=2, load_doors=2,
+                               start=START_TIME)
+    for _ in range(size):
+        action, data, start_time, end_time, door = next(records)
+        reader.pending.append((action, *data, start_time, end_time, door))
+    chart.refresh()
+
+    samples = []
+    for _ in range(GANTT_SAMPLES):
+        for _ in range(GANTT_BATCH):
+            action, data, start_time, end_time, door = next(records)
+            reader.pending.append((action, *data, start_time, end_time, door))
+        samples.append(timed(chart.refresh)[0])
+    return samples
+
+
+# Импорт манифеста из size строк; замер — одна пачка IMPORT_CHUNK машин, включая чтение и проверку.
+def bench_import_manifest(size, seed, extension):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "manifest" + extension)
+        write_manifest(filename, seed, size, start=START_TIME)
+        simulation = CrossDockSimulation(now=START_TIME + size)
+        samples = []
+        last = [time.perf_counter()]
+
+        def progress(_stats):
+            now = time.perf_counter()
+            samples.append(now - last[0])
+            last[0] = now
+
+        import_manifest(filename, simulation, chunk_size=IMPORT_CHUNK, progress=progress, now=START_TIME + size)
+        return samples
+
+
+@case("import_manifest_jsonl")
+def bench_import_manifest_jsonl(size, seed):
+    return bench_import_manifest(size, seed, ".jsonl")
+
+
+@case("import_manifest_csv")
+def bench_import_manifest_csv(size, seed):
+    return bench_import_manifest(size, seed, ".csv")
+
+
+# Холодный запуск в отдельном процессе с файлами состояния на size машин.
+def bench_startup(size, seed, mode):
+    repository = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_workload(directory, seed, size, start=START_TIME)
+        for _ in range(STARTUP_SAMPLES):
+            result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, repr(time.time()), mode, repository],
+                                    cwd=directory, capture_output=True, text=True)
+            if result.returncode != 0:
+                # Нет дисплея для Tk или зависимостей окна
+                return None
+            samples.append(float(result.stdout.split()[0]))
+    return samples
+
+
+# Импорт main — то, что раньше тянуло pandas и matplotlib.
+@case("startup_import")
+def bench_startup_import(size, seed):
+    return bench_startup(size, seed, "import")
+
+
+# До первой отрисовки окна с очередями; диаграмма Ганта не открывается.
+@case("startup_window")
+def bench_startup_window(size, seed):
+    return bench_startup(size, seed, "window")
+
+
+"""Запуск и отчет"""
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(name, size, samples, peak):
+    ordered = sorted(samples)
+    micro = 1e6
+    return {
+        "case": name,
+        "size": size,
+        "calls": len(samples),
+        "mean_us": statistics.mean(samples) * micro,
+        "p50_us": percentile(ordered, 0.50) * micro,
+        "p95_us": percentile(ordered, 0.95) * micro,
+        "p99_us": percentile(ordered, 0.99) * micro,
+        "max_us": ordered[-1] * micro,
+        "total_s": sum(samples),
+        "peak_kib": peak / 1024 if peak is not None else None,
+    }
+
+
+def measure_memory(function, size, seed):
+    tracemalloc.start()
+    try:
+        function(size, seed)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, cases=None, seed=0, memory=True, log=sys.stderr):
+    results = []
+    for size in sizes:
+        for name, function in CASES.items():
+            if cases and name not in cases:
+                continue
+            samples = function(size, seed)
+            if not samples:
+                print(f"{name} [{size}]: пропущено", file=log)
+                continue
+            # Память меряется отдельным прогоном: tracemalloc искажает время
+            peak = measure_memory(function, size, seed) if memory else None
+            result = summarize(name, size, samples, peak)
+            results.append(result)
+            print(format_result(result), file=log)
+    return results
+
+
+def format_result(result):
+    memory = f"{result['peak_kib']:.0f} KiB" if result["peak_kib"] is not None else "-"
+    return (f"{result['case']:>20} [{result['size']:>8}]: mean {result['mean_us']:9.1f} us  "
+            f"p50 {result['p50_us']:9.1f}  p99 {result['p99_us']:9.1f}  peak {memory}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(results, filename, sizes, seed):
+    report = {
+        "revision": git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "sizes": sizes,
+        "results": results,
+    }
+    with open(filename, "w", encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+# Отношение p50 к сохраненному прогону: больше 1 — медленнее, чем было.
+def compare(results, baseline_file, file=sys.stdout):
+    with open(baseline_file, "r", encoding='utf-8') as f:
+        baseline = {(result["case"], result["size"]): result for result in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get((result["case"], result["size"]))
+        if before is None or not before["p50_us"]:
+            continue
+        ratio = result["p50_us"] / before["p50_us"]
+        print(f"{result['case']:>20} [{result['size']:>8}]: p50 x{ratio:.2f}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки планировщика кросс-докинга")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="машин в очередях")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="только эти случаи")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора нагрузки")
+    parser.add_argument("--no-memory", action="store_true", help="не измерять пиковую память")
+    parser.add_argument("--output", default="benchmark_results.json", help="файл результатов JSON")
+    parser.add_argument("--compare", help="сравнить с результатами из JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.cases, args.seed, memory=not args.no_memory)
+    if args.compare:
+        compare(results, args.compare)
+    save(results, args.output, args.sizes, args.seed)
+
+
+if __name__ == "__main__":
+    main()
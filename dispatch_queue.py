@@ -0,0 +1,164 @@
+import heapq
+
+import storage
+
+
+class DispatchQueue:
+    """Очередь машин с выбором лучшей по приоритету за O(log n).
+
+    Приоритет машины — ``waiting_weight * ожидание + item_score(товар)``.
+    В один момент времени у всех машин одинаковое "сейчас", поэтому
+    порядок внутри одного товара задается только временем прибытия:
+    машины лежат в куче своего товара (корзине). Оценка товара
+    запрашивается лениво при выборе, так что изменения склада и очереди
+    загрузки не требуют пересортировки. Корзина сборного груза — набор
+    его товаров (``storage.item_key``), а не вся строка с количествами. Удаление по номеру ленивое:
+    запись пропадает из ``entries`` и выбрасывается из кучи, когда
+    окажется в ее вершине.
+
+    Наблюдатели ``observers`` получают каждое изменение состава очереди:
+    ``observer(event, seq, task)``, где event — "push", "remove" или "clear".
+    """
+
+    def __init__(self, item_score, waiting_weight=1.0):
+        self.item_score = item_score
+        self.waiting_weight = waiting_weight
+
+        self.entries = {}  # seq -> (время прибытия в секундах эпохи, машина), порядок постановки
+        self.buckets = {}  # товар или набор товаров -> куча (время прибытия, seq)
+        self.by_plate = {}  # гос. номер -> множество seq
+        self.counter = 0
+        self.observers = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __iter__(self):
+        return (task for _, task in self.entries.values())
+
+    # Пары (seq, машина) в порядке постановки; seq — постоянный ключ записи.
+    def items(self):
+        return ((seq, task) for seq, (_, task) in self.entries.items())
+
+    def push(self, task):
+        plate, arrival, item, _ = task
+
+        self.counter += 1
+        seq = self.counter
+        self.entries[seq] = (arrival, task)
+        heapq.heappush(self.buckets.setdefault(storage.item_key(item), []), (arrival, seq))
+        self.by_plate.setdefault(plate, set()).add(seq)
+        self.notify("push", seq, task)
+
+    def extend(self, tasks):
+        for task in tasks:
+            self.push(task)
+
+    def clear(self):
+        self.entries.clear()
+        self.buckets.clear()
+        self.by_plate.clear()
+        self.notify("clear", None, None)
+
+    def notify(self, event, seq, task):
+        for observer in self.observers:
+            observer(event, seq, task)
+
+    # Вершина кучи товара без удаленных записей.
+    def head(self, item):
+        heap = self.buckets[item]
+        while heap and heap[0][1] not in self.entries:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def best(self):
+        best_key, best_item = None, None
+        for item in list(self.buckets):
+            head = self.head(item)
+            if head is None:
+                del self.buckets[item]
+                continue
+            arrival, seq = head
+            key = (self.item_score(item) - self.waiting_weight * arrival, -seq)
+            if best_key is None or key > best_key:
+                best_key, best_item = key, item
+        return best_item
+
+    # До n живых машин товара в порядке прибытия: обход кучи от вершины, O(n log n).
+    def earliest(self, item, n):
+        heap = self.buckets.get(item)
+        if not heap:
+            return []
+        result = []
+        frontier = [(heap[0], 0)]
+        while frontier and len(result) < n:
+            (_, seq), index = heapq.heappop(frontier)
+            if seq in self.entries:
+                result.append(self.entries[seq][1])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+    def peek(self):
+        item = self.best()
+        if item is None:
+            return None
+        _, seq = self.buckets[item][0]
+        return self.entries[seq][1]
+
+    def pop(self):
+        item = self.best()
+        if item is None:
+            raise IndexError("pop from empty dispatch queue")
+        _, seq = heapq.heappop(self.buckets[item])
+        _, task = self.entries.pop(seq)
+        self.discard_plate(task[0], seq)
+        self.notify("remove", seq, task)
+        return task
+
+    # Стоит ли в очереди машина с этим номером и временем прибытия.
+    def contains(self, plate, time_arrived):
+        entries = self.entries
+        return any(entries[seq][1][1] == time_arrived for seq in self.by_plate.get(plate, ()))
+
+    # Убирает из очереди все машины с указанным номером и возвращает их.
+    def remove(self, plate):
+        removed = []
+        for seq in sorted(self.by_plate.pop(plate, ())):
+            task = self.entries.pop(seq)[1]
+            removed.append(task)
+            self.notify("remove", seq, task)
+        return removed
+
+    # Убирает одну машину с точно такими же данными.
+    def discard(self, task):
+        for seq in sorted(self.by_plate.get(task[0], ())):
+            if self.entries[seq][1] == task:
+                del self.entries[seq]
+                self.discard_plate(task[0], seq)
+                self.notify("remove", seq, task)
+                return True
+        return False
+
+    def discard_plate(self, plate, seq):
+        seqs = self.by_plate.get(plate)
+        if seqs is not None:
+            seqs.discard(seq)
+            if not seqs:
+                del self.by_plate[plate]
+
+    # Машины в порядке текущего приоритета (для отображения и отчетов).
+    def ordered(self):
+        scores = {}
+        for item in self.buckets:
+            scores[item] = self.item_score(item)
+
+        def key(pair):
+            seq, (arrival, task) = pair
+            return (-(scores[storage.item_key(task[2])] - self.waiting_weight * arrival), seq)
+
+        return [task for _, (_, task) in sorted(self.entries.items(), key=key)]
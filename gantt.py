@@ -0,0 +1,427 @@
+import heapq
+import math
+import os
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from operator import itemgetter
+
+from matplotlib.collections import PolyCollection
+from matplotlib.lines import Line2D
+from matplotlib.ticker import FuncFormatter
+
+import storage
+from timeutil import SECONDS_PER_DAY, ClockSequence, format_clock
+
+PRODUCT_COLORS = {
+    "Товар 1": "green",
+    "Товар 2": "blue",
+    "Товар 3": "red",
+}
+DEFAULT_COLOR = "gray"
+MIXED_COLOR = "purple"  # сборный груз: одна полоса на всю машину
+MIXED_LABEL = "Сборный груз"
+MERGED_COLOR = "dimgray"  # несколько операций, слитых в одну полосу
+
+BAR_HEIGHT = 0.8
+MIN_BAR_PIXELS = 2  # полосы уже этого сливаются с соседними
+ZOOM_STEP = 1.5
+PAN_STEP = 0.25  # доля окна на одно нажатие стрелки
+ARCHIVE_WINDOW = SECONDS_PER_DAY
+# Место легенды задано: с "best" matplotlib перебирает все полосы при каждой отрисовке
+LEGEND_LOCATION = "upper right"
+
+
+def item_color(item):
+    if storage.is_manifest(item):
+        return MIXED_COLOR
+    return PRODUCT_COLORS.get(item, DEFAULT_COLOR)
+
+
+# Снимок того, что нужно нарисовать: имена дорожек, по дорожкам — прямоугольники
+# и их цвета, пределы осей. Не ссылается на изменяемое состояние диаграммы,
+# поэтому его можно отдать на отрисовку в другой поток.
+Scene = namedtuple("Scene", "lanes verts colors xlim ylim")
+
+
+def format_seconds(value, _position=None):
+    return format_clock(value)
+
+
+class Lane:
+    """Операции одной дорожки, отсортированные по началу.
+
+    ``reach[i]`` — самый поздний конец среди первых ``i + 1`` операций;
+    по нему и по началам двоичным поиском находятся операции окна и
+    границы слитых полос.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.colors = []
+        self.reach = []
+        self.max_duration = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, end, color):
+        self.max_duration = max(self.max_duration, end - start)
+        if not self.starts or start >= self.starts[-1]:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.colors.append(color)
+            self.reach.append(end if not self.reach else max(self.reach[-1], end))
+            return
+        # Запись не по порядку (архив после живой истории) — вставка и пересчет хвоста reach
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.colors.insert(index, color)
+        self.reach.insert(index, end)
+        for i in range(index, len(self.reach)):
+            self.reach[i] = max(self.reach[i - 1], self.ends[i]) if i else self.ends[i]
+
+    # Пачка операций (начало, конец, цвет) в любом порядке: одна сортировка пачки,
+    # одно слияние с дорожкой и один проход по reach вместо вставки каждой.
+    def extend(self, bars):
+        if not bars:
+            return
+        bars = sorted(bars, key=itemgetter(0))
+        self.max_duration = max(self.max_duration, max(end - start for start, end, _ in bars))
+        if self.starts and bars[0][0] < self.starts[-1]:
+            # При равном начале старые операции остаются первыми, как в add
+            bars = list(heapq.merge(zip(self.starts, self.ends, self.colors), bars, key=itemgetter(0)))
+            self.starts, self.ends, self.colors, self.reach = [], [], [], []
+        reach = self.reach[-1] if self.reach else None
+        for start, end, color in bars:
+            reach = end if reach is None else max(reach, end)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.colors.append(color)
+            self.reach.append(reach)
+
+    # Полосы окна [x0, x1] при ширине пикселя pixel: (начало, конец, цвет).
+    # Операции уже min_width сливаются в одну полосу, пока она не станет шире
+    # min_width или не встретит промежуток больше пикселя, поэтому полос не больше,
+    # чем пикселей в окне, а каждый шаг — двоичный поиск.
+    def spans(self, x0, x1, pixel, min_width):
+        starts, ends, reach = self.starts, self.ends, self.reach
+        i = bisect_left(starts, x0 - self.max_duration)
+        stop = bisect_right(starts, x1)
+        while i < stop:
+            start, end = starts[i], ends[i]
+            if end < x0:
+                i += 1
+                continue
+            if end - start >= min_width:
+                yield start, end, self.colors[i]
+                i += 1
+                continue
+            j = i + 1
+            while end - start < min_width:
+                k = bisect_right(starts, end + pixel, j, stop)
+                if k == j:
+                    break
+                end = max(end, reach[k - 1])
+                j = k
+            yield start, end, self.colors[i] if j == i + 1 else MERGED_COLOR
+            i = j
+
+
+class GanttAxes:
+    """Оси matplotlib, на которых рисуются снимки диаграммы (``Scene``)."""
+
+    def __init__(self, ax):
+        self.ax = ax
+        self.lanes = ()
+        self.collections = []
+        self.setup_axes()
+
+    def setup_axes(self):
+        self.ax.clear()
+        self.ax.set_xlabel("Время (HH:MM:SS)")
+        self.ax.set_ylabel("Пост / операция")
+        self.ax.set_title("Диаграмма Ганта")
+        self.ax.xaxis.set_major_formatter(FuncFormatter(format_seconds))
+
+        colors = {**PRODUCT_COLORS, MIXED_LABEL: MIXED_COLOR}
+        handles = [Line2D([0], [0], color=color, lw=4) for color in colors.values()]
+        self.ax.legend(handles, list(colors.keys()), title="Товары", loc=LEGEND_LOCATION)
+
+    def draw(self, scene):
+        if scene.lanes[:len(self.lanes)] != self.lanes:
+            # Диаграмма начата заново
+            self.lanes = ()
+            self.collections = []
+            self.setup_axes()
+        if scene.lanes != self.lanes:
+            for _ in range(len(self.lanes), len(scene.lanes)):
+                collection = PolyCollection([], edgecolors="black")
+                self.ax.add_collection(collection)
+                self.collections.append(collection)
+            self.ax.set_yticks(range(len(scene.lanes)))
+            self.ax.set_yticklabels(scene.lanes)
+            self.lanes = scene.lanes
+
+        for collection, verts, colors in zip(self.collections, scene.verts, scene.colors):
+            collection.set_verts(verts)
+            collection.set_facecolor(colors)
+        if scene.xlim is not None:
+            self.ax.set_xlim(*scene.xlim)
+        self.ax.set_ylim(*scene.ylim)
+
+
+class AxesTarget:
+    """Отрисовка в потоке вызывающего прямо на холст matplotlib."""
+
+    def __init__(self, ax, canvas):
+        self.axes = GanttAxes(ax)
+        self.canvas = canvas
+
+    def width(self):
+        return self.axes.ax.bbox.width
+
+    def show(self, scene):
+        self.axes.draw(scene)
+        self.canvas.draw_idle()
+
+    def connect(self, chart):
+        def on_scroll(event):
+            if event.inaxes is self.axes.ax:
+                chart.zoom(1 / ZOOM_STEP if event.button == "up" else ZOOM_STEP, event.xdata)
+
+        def on_key(event):
+            chart.on_key(event.key)
+
+        self.canvas.mpl_connect("scroll_event", on_scroll)
+        self.canvas.mpl_connect("key_press_event", on_key)
+
+
+class GanttChart:
+    """Инкрементальная диаграмма Ганта по истории операций, дорожка на пост.
+
+    Записи берутся у читателя журнала истории (``reader``), а без него —
+    из файла с запомненного смещения, поэтому каждая строка истории
+    разбирается один раз. Ось времени — секунды эпохи, поэтому смены через
+    полночь рисуются подряд. С архивом (``history_archive.HistoryArchive`` или
+    ``sqlite_storage.SQLiteStorage`` — у них одни и те же запросы по окну) на
+    диаграмму сначала добавляются последние ``archive_window`` секунд архива,
+    а при сдвиге, масштабе и Home дочитывается только вновь открытая часть
+    окна.
+
+    Рисуются только операции видимого окна времени, а операции уже
+    ``MIN_BAR_PIXELS`` пикселей сливаются в общие полосы, поэтому цена
+    отрисовки зависит от ширины экрана, а не от длины истории. Колесо мыши
+    меняет масштаб вокруг курсора, стрелки влево/вправо сдвигают окно,
+    Home возвращает всю историю.
+
+    Сама диаграмма только собирает снимок (``Scene``); рисует его ``target`` —
+    ``AxesTarget`` прямо на холсте или ``gantt_render.GanttView`` в фоновом потоке.
+    """
+
+    def __init__(self, target, history_file=None, reader=None, archive=None, archive_window=ARCHIVE_WINDOW):
+        self.target = target
+        self.history_file = history_file
+        self.reader = reader
+        self.offset = 0
+        self.sequence = ClockSequence()
+
+        self.lanes = {}  # операция -> номер дорожки
+        self.lane_data = []  # по дорожкам: Lane
+
+        self.min_x = None
+        self.max_x = None
+        self.window = None  # (начало, конец) или None — вся история
+        self.dirty = True
+
+        self.archive = archive
+        self.archive_window = archive_window
+        self.archived = None  # (начало, конец) уже прочитанной части архива
+
+        self.target.connect(self)
+        self.load_recent_archive()
+
+    """Архив"""
+    def load_recent_archive(self):
+        time_range = self.archive.time_range() if self.archive is not None else None
+        if time_range is not None:
+            _, last_end = time_range
+            self.load_archived(last_end - self.archive_window, last_end)
+            # Все, что закончится позже, приходит от читателя истории
+            self.archived = (self.archived[0], math.inf)
+
+    # Добавляет операции архива, пересекающиеся с [start, end], кроме уже прочитанных.
+    def load_archived(self, start, end):
+        if self.archive is None:
+            return
+        if self.archived is None:
+            records = self.archive.records_between(start, end)
+            self.archived = (start, end)
+        else:
+            loaded_start, loaded_end = self.archived
+            records = []
+            # Операции, задевающие уже прочитанное окно, на диаграмме есть
+            if start < loaded_start:
+                records += [record for record in self.archive.records_between(start, loaded_start)
+                            if record[6] < loaded_start]
+            if end > loaded_end:
+                records += [record for record in self.archive.records_between(loaded_end, end)
+                            if record[5] > loaded_end]
+            self.archived = (min(start, loaded_start), max(end, loaded_end))
+        self.add_records(records)
+
+    def reset(self):
+        self.offset = 0
+        self.sequence = ClockSequence()
+        self.lanes = {}
+        self.lane_data = []
+        self.min_x = None
+        self.max_x = None
+        self.window = None
+        self.dirty = True
+        self.archived = None
+        self.load_recent_archive()
+
+    """Чтение новых строк истории"""
+    def read_new_records(self):
+        if self.reader is not None:
+            return self.reader.read_new()
+        try:
+            size = os.path.getsize(self.history_file)
+        except FileNotFoundError:
+            return []
+        if size < self.offset:
+            # Файл перезаписан заново — строим диаграмму с нуля
+            self.reset()
+        if size == self.offset:
+            return []
+
+        with open(self.history_file, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+
+        # Незавершенную последнюю строку оставляем до следующего опроса
+        complete = chunk.rfind(b"\n") + 1
+        self.offset += complete
+        lines = chunk[:complete].decode("utf-8").splitlines()
+        records = (storage.parse_history_record(tuple(line.strip().split(";")), self.sequence)
+                   for line in lines if line.strip())
+        return [record for record in records if record is not None]
+
+    # Запись в формате storage.parse_history_record: время — секунды эпохи.
+    def add_record(self, record):
+        operation, _, _, item, _, start, end, door = record
+        # Дорожка — пост, если он записан, иначе вид операции
+        lane_name = door or operation
+
+        lane = self.lanes.get(lane_name)
+        if lane is None:
+            lane = self.add_lane(lane_name)
+
+        self.lane_data[lane].add(start, end, item_color(item))
+
+        self.min_x = start if self.min_x is None else min(self.min_x, start)
+        self.max_x = end if self.max_x is None else max(self.max_x, end)
+        self.dirty = True
+
+    # Пачка записей (архив) — по дорожкам через Lane.extend.
+    def add_records(self, records):
+        batches = {}
+        for operation, _, _, item, _, start, end, door in records:
+            batches.setdefault(door or operation, []).append((start, end, item_color(item)))
+        for lane_name, bars in batches.items():
+            lane = self.lanes.get(lane_name)
+            if lane is None:
+                lane = self.add_lane(lane_name)
+            self.lane_data[lane].extend(bars)
+
+            first, last = min(bar[0] for bar in bars), max(bar[1] for bar in bars)
+            self.min_x = first if self.min_x is None else min(self.min_x, first)
+            self.max_x = last if self.max_x is None else max(self.max_x, last)
+            self.dirty = True
+
+    def add_lane(self, name):
+        lane = len(self.lane_data)
+        self.lanes[name] = lane
+        self.lane_data.append(Lane())
+        return lane
+
+    """Окно времени"""
+    def view_range(self):
+        if self.window is not None:
+            return self.window
+        if self.min_x is None:
+            return None
+        return self.min_x, max(self.max_x, self.min_x + 1)
+
+    def set_window(self, start, end):
+        self.window = (start, max(end, start + 1))
+        self.load_archived(*self.window)
+        self.redraw()
+
+    def show_all(self):
+        self.window = None
+        time_range = self.archive.time_range() if self.archive is not None else None
+        if time_range is not None:
+            self.load_archived(*time_range)
+        self.redraw()
+
+    def zoom(self, factor, center=None):
+        view = self.view_range()
+        if view is None:
+            return
+        x0, x1 = view
+        if center is None:
+            center = (x0 + x1) / 2
+        self.set_window(center - (center - x0) * factor, center + (x1 - center) * factor)
+
+    def pan(self, fraction):
+        view = self.view_range()
+        if view is None:
+            return
+        x0, x1 = view
+        shift = (x1 - x0) * fraction
+        self.set_window(x0 + shift, x1 + shift)
+
+    def on_key(self, key):
+        if key == "left":
+            self.pan(-PAN_STEP)
+        elif key == "right":
+            self.pan(PAN_STEP)
+        elif key == "home":
+            self.show_all()
+
+    """Отрисовка"""
+    def refresh(self):
+        for record in self.read_new_records():
+            self.add_record(record)
+        if not self.dirty:
+            return False
+        self.redraw()
+        return True
+
+    # Снимок видимого окна для области графика шириной width пикселей.
+    def scene(self, width):
+        view = self.view_range()
+        lanes = tuple(self.lanes)
+        ylim = (-1, max(len(lanes), 1))
+        if view is None:
+            return Scene(lanes, [[] for _ in lanes], [[] for _ in lanes], None, ylim)
+
+        x0, x1 = view
+        pixel = (x1 - x0) / max(width, 1)
+        all_verts, all_colors = [], []
+        for lane, data in enumerate(self.lane_data):
+            y0, y1 = lane - BAR_HEIGHT / 2, lane + BAR_HEIGHT / 2
+            verts, colors = [], []
+            for start, end, color in data.spans(x0, x1, pixel, pixel * MIN_BAR_PIXELS):
+                verts.append(((start, y0), (start, y1), (end, y1), (end, y0)))
+                colors.append(color)
+            all_verts.append(verts)
+            all_colors.append(colors)
+        return Scene(lanes, all_verts, all_colors, view, ylim)
+
+    def redraw(self):
+        self.target.show(self.scene(self.target.width()))
+        self.dirty = False
@@ -0,0 +1,171 @@
+import threading
+import tkinter as tk
+from collections import namedtuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from gantt import ZOOM_STEP, GanttAxes
+
+DPI = 100
+POLL_MS = 30  # как часто окно забирает готовый кадр, пока идет отрисовка
+
+# Готовый кадр: изображение PPM и то, где на нем лежит область графика, —
+# по ним события мыши переводятся в секунды оси времени.
+Frame = namedtuple("Frame", "image width height axes_left axes_right xlim")
+
+
+class BackgroundRenderer:
+    """Фоновый поток, рисующий снимки диаграммы в буфер Agg.
+
+    Поток владеет своей фигурой matplotlib, поэтому окна Tk он не
+    касается. Ждущий снимок всего один: новый снимок заменяет еще не
+    начатый, а готовый кадр — не забранный, так что при отставании
+    отрисовки промежуточные кадры пропускаются.
+    """
+
+    def __init__(self, width, height, dpi=DPI):
+        self.figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = GanttAxes(self.figure.add_subplot())
+        self.axes_fraction = self.axes.ax.get_position().width
+        self.requested_width = width
+
+        self.condition = threading.Condition()
+        self.pending = None  # снимок, ждущий отрисовки
+        self.size = None  # новый размер фигуры, применяется перед отрисовкой
+        self.frame = None  # последний готовый и не забранный кадр
+        self.busy = False
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, name="gantt-render", daemon=True)
+        self.thread.start()
+
+    def submit(self, scene):
+        with self.condition:
+            self.pending = scene
+            self.condition.notify()
+
+    def resize(self, width, height):
+        with self.condition:
+            self.size = (width, height)
+            self.requested_width = width
+
+    def take_frame(self):
+        with self.condition:
+            frame, self.frame = self.frame, None
+            return frame
+
+    def idle(self):
+        with self.condition:
+            return self.pending is None and not self.busy and self.frame is None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                scene, self.pending = self.pending, None
+                size, self.size = self.size, None
+                self.busy = True
+            frame = self.render(scene, size)
+            with self.condition:
+                self.frame = frame
+                self.busy = False
+
+    def render(self, scene, size):
+        if size is not None:
+            width, height = size
+            self.figure.set_size_inches(width / self.figure.dpi, height / self.figure.dpi)
+        self.axes.draw(scene)
+        self.canvas.draw()
+
+        pixels = np.asarray(self.canvas.buffer_rgba())
+        height, width = pixels.shape[:2]
+        image = b"P6 %d %d 255\n" % (width, height) + pixels[:, :, :3].tobytes()
+        bbox = self.axes.ax.bbox
+        return Frame(image, width, height, bbox.x0, bbox.x1, self.axes.ax.get_xlim())
+
+    # Ширина области графика в пикселях при последнем запрошенном размере фигуры.
+    def axes_width(self):
+        return self.axes_fraction * self.requested_width
+
+
+class GanttView(tk.Canvas):
+    """Холст Tk, показывающий кадры ``BackgroundRenderer``.
+
+    Поток Tk только собирает снимок и подменяет картинку готовым кадром,
+    поэтому отрисовка matplotlib не задерживает ввод в главном окне.
+    Подходит как ``target`` для ``gantt.GanttChart``.
+    """
+
+    def __init__(self, master, width=1200, height=600, dpi=DPI):
+        super().__init__(master, width=width, height=height, highlightthickness=0)
+        self.renderer = BackgroundRenderer(width, height, dpi)
+        self.chart = None
+        self.photo = None
+        self.frame = None
+        self.image_id = self.create_image(0, 0, anchor=tk.NW)
+        self.after_id = None
+
+        self.bind("<Configure>", self.on_resize)
+        self.bind("<MouseWheel>", lambda event: self.on_scroll(event.x, event.delta > 0))
+        self.bind("<Button-4>", lambda event: self.on_scroll(event.x, True))
+        self.bind("<Button-5>", lambda event: self.on_scroll(event.x, False))
+        self.bind("<Enter>", lambda event: self.focus_set())
+        for key in ("Left", "Right", "Home"):
+            self.bind(f"<{key}>", lambda event, key=key.lower(): self.chart and self.chart.on_key(key))
+
+    """Интерфейс target для GanttChart"""
+    def width(self):
+        return self.renderer.axes_width()
+
+    def show(self, scene):
+        self.renderer.submit(scene)
+        if self.after_id is None:
+            self.after_id = self.after(POLL_MS, self.poll)
+
+    def connect(self, chart):
+        self.chart = chart
+
+    """Кадры"""
+    def poll(self):
+        self.after_id = None
+        frame = self.renderer.take_frame()
+        if frame is not None:
+            self.frame = frame
+            self.photo = tk.PhotoImage(data=frame.image, format="PPM")
+            self.itemconfigure(self.image_id, image=self.photo)
+        if not self.renderer.idle():
+            self.after_id = self.after(POLL_MS, self.poll)
+
+    def close(self):
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+        self.renderer.close()
+
+    """События"""
+    def on_resize(self, event):
+        if event.width < 2 or event.height < 2:
+            return
+        self.renderer.resize(event.width, event.height)
+        if self.chart is not None:
+            self.chart.redraw()
+
+    def on_scroll(self, x, zoom_in):
+        frame = self.frame
+        if self.chart is None or frame is None or not frame.axes_left <= x <= frame.axes_right:
+            return
+        x0, x1 = frame.xlim
+        center = x0 + (x - frame.axes_left) / (frame.axes_right - frame.axes_left) * (x1 - x0)
+        self.chart.zoom(1 / ZOOM_STEP if zoom_in else ZOOM_STEP, center)
@@ -0,0 +1,47 @@
+import storage
+
+
+class HandlingRates:
+    """Нормы времени обработки товара, собранные в словарь при загрузке.
+
+    Нормы приходят строками ``(товар, секунд на единицу)`` из файла или
+    базы; при создании они один раз переводятся в ``rates`` (товар ->
+    int), поэтому длительность работы считается одним обращением к
+    словарю без поиска по списку и ``int()`` на каждую машину. Если товар
+    встречается дважды, действует первая строка, как при прежнем поиске.
+    Время сборного груза — сумма времени его строк по нормам их товаров.
+    Итерация отдает исходные строки, чтобы их можно было сохранить как есть.
+    """
+
+    def __init__(self, times=()):
+        self.times = list(times)
+        self.rates = {}
+        for item, seconds in self.times:
+            self.rates.setdefault(item, int(seconds))
+
+    def __iter__(self):
+        return iter(self.times)
+
+    def __len__(self):
+        return len(self.times)
+
+    def rate(self, item):
+        return self.rates.get(item, 0)
+
+    # Длительность работы с машиной (plate, time_arrived, item, quantity) в секундах.
+    def duration(self, task):
+        return self.item_duration(task[2], int(task[3]))
+
+    def item_duration(self, item, quantity):
+        rate = self.rates.get(item)
+        if rate is not None:
+            return rate * quantity
+        if storage.is_manifest(item):
+            return sum(self.rates.get(name, 0) * count for name, count in storage.parse_manifest(item))
+        return 0
+
+    # Длительности для целой очереди или списка кандидатов за один проход.
+    def durations(self, tasks):
+        rates = self.rates
+        return [rates[item] * int(quantity) if item in rates else self.item_duration(item, int(quantity))
+                for _, _, item, quantity in tasks]
@@ -0,0 +1,263 @@
+"""Колоночный архив закрытых периодов истории операций.
+
+Каждый сегмент — каталог с колонками NumPy (``.npy``) одинаковой
+длины, отсортированными по началу операции: время хранится целыми
+секундами эпохи, а машина, товар, пост и вид операции — номерами в
+словарях сегмента (``meta.json``). Колонки открываются через
+``mmap_mode="r"``, и запрос читает с диска только строки нужного окна,
+поэтому время запуска и обновления не растет вместе с архивом. NumPy
+загружается при первой записи или чтении сегмента, а не при импорте.
+Рядом с сегментами лежит снимок показателей (``kpi.json``) с именами
+сегментов, которые в нем учтены.
+
+    python history_archive.py roll                    # перенести прошлые сутки из файла истории
+    python history_archive.py query 2024-01-01T08:00 2024-01-01T20:00
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import storage
+from timeutil import local_midnight, now
+
+np = None  # загружается load_numpy при первом обращении к колонкам
+
+ARCHIVE_DIR = "history_archive"
+KPI_CHECKPOINT = "kpi.json"  # снимок показателей по уже перенесенным сегментам
+
+TIME_COLUMNS = ("start", "end", "arrival")
+CODED_COLUMNS = ("action", "plate", "item", "door")
+COLUMNS = TIME_COLUMNS + ("quantity",) + CODED_COLUMNS
+
+
+# Архив доступен только с NumPy; проверка не импортирует сам пакет.
+def numpy_available():
+    return np is not None or importlib.util.find_spec("numpy") is not None
+
+
+def load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("для архива истории нужен numpy") from None
+        np = numpy
+    return np
+
+
+class Segment:
+    """Один закрытый период архива; колонки отображаются в память по первому обращению."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), "r", encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.first_start = self.meta["first_start"]
+        self.last_end = self.meta["last_end"]
+        self.columns = {}
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def column(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = load_numpy().load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return column
+
+    # Номера строк операций, пересекающихся с окном [start, end].
+    def rows_between(self, start, end):
+        starts = self.column("start")
+        # Строки отсортированы по началу; раньше start - max_duration пересечений быть не может
+        low = int(np.searchsorted(starts, start - self.meta["max_duration"], side="left"))
+        high = int(np.searchsorted(starts, end, side="right"))
+        ends = self.column("end")[low:high]
+        return low + np.flatnonzero(ends >= start)
+
+    def decode(self, name, codes):
+        dictionary = self.meta["dictionaries"][name]
+        return [dictionary[code] if code >= 0 else None for code in codes.tolist()]
+
+    # Все операции сегмента в формате storage.parse_history_record.
+    def records(self):
+        coded = {name: self.decode(name, self.column(name)) for name in CODED_COLUMNS}
+        return list(zip(coded["action"], coded["plate"], self.column("arrival").tolist(), coded["item"],
+                        self.column("quantity").tolist(), self.column("start").tolist(),
+                        self.column("end").tolist(), coded["door"]))
+
+
+class HistoryArchive:
+    """Набор сегментов архива в каталоге ``directory``."""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        if not numpy_available():
+            raise ImportError("для архива истории нужен numpy")
+        self.directory = directory
+        self.loaded = None
+
+    def segments(self):
+        if self.loaded is None:
+            self.loaded = []
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    path = os.path.join(self.directory, name)
+                    if not name.endswith(".tmp") and os.path.exists(os.path.join(path, "meta.json")):
+                        self.loaded.append(Segment(path))
+            self.loaded.sort(key=lambda segment: segment.first_start)
+        return self.loaded
+
+    """Запись"""
+    # Записи в формате storage.parse_history_record -> новый сегмент.
+    def write_segment(self, records):
+        load_numpy()
+        records = sorted(records, key=lambda record: record[5])
+        dictionaries = {name: {} for name in CODED_COLUMNS}
+
+        def code(name, value):
+            if value is None:
+                return -1
+            codes = dictionaries[name]
+            return codes.setdefault(value, len(codes))
+
+        columns = {
+            "action": [code("action", record[0]) for record in records],
+            "plate": [code("plate", record[1]) for record in records],
+            "arrival": [record[2] for record in records],
+            "item": [code("item", record[3]) for record in records],
+            "quantity": [record[4] for record in records],
+            "start": [record[5] for record in records],
+            "end": [record[6] for record in records],
+            "door": [code("door", record[7]) for record in records],
+        }
+        first_start = int(min(columns["start"]))
+        last_end = int(max(columns["end"]))
+        meta = {
+            "count": len(records),
+            "first_start": first_start,
+            "last_end": last_end,
+            "max_duration": int(max(end - start for start, end in zip(columns["start"], columns["end"]))),
+            "dictionaries": {name: list(codes) for name, codes in dictionaries.items()},
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{first_start:012d}-{last_end:012d}")
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in columns.items():
+            dtype = np.int64 if name in TIME_COLUMNS else np.int32
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(values, dtype=dtype))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        # Сегмент появляется целиком или не появляется вовсе
+        os.replace(tmp_path, path)
+        self.loaded = None
+        return path
+
+    # Переносит операции, закончившиеся до cutoff, из файла истории в новый сегмент;
+    # в файле остается только текущий (открытый) период.
+    def roll(self, history_file=storage.HISTORY_FILE, cutoff=None):
+        if cutoff is None:
+            cutoff = local_midnight(now())
+        try:
+            records = storage.read_history_records(history_file)
+        except FileNotFoundError:
+            return 0
+        closed = [record for record in records if record[6] < cutoff]
+        if not closed:
+            return 0
+        self.write_segment(closed)
+
+        tmp_file = history_file + ".tmp"
+        with open(tmp_file, "w", encoding='utf-8') as f:
+            for action, plate, arrival, item, quantity, start, end, door in records:
+                if end >= cutoff:
+                    f.write(storage.format_history_record(action, (plate, arrival, item, quantity), start, end,
+                                                          door))
+        os.replace(tmp_file, history_file)
+        return len(closed)
+
+    """Снимок показателей"""
+    # (имена учтенных сегментов, состояние KPIEngine.state) или ([], None).
+    def read_kpi_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, KPI_CHECKPOINT), "r", encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return [], None
+        return checkpoint["segments"], checkpoint["state"]
+
+    def write_kpi_checkpoint(self, segments, state):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, KPI_CHECKPOINT)
+        with open(path + ".tmp", "w", encoding='utf-8') as f:
+            json.dump({"segments": segments, "state": state}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    """Чтение"""
+    # Колонки операций, пересекающихся с окном [start, end]: время и количество — массивы,
+    # машина, товар, пост и вид операции — списки строк.
+    def columns_between(self, start, end):
+        load_numpy()
+        parts = {name: [] for name in COLUMNS}
+        for segment in self.segments():
+            if segment.last_end < start or segment.first_start > end:
+                continue
+            rows = segment.rows_between(start, end)
+            if not len(rows):
+                continue
+            for name in TIME_COLUMNS + ("quantity",):
+                parts[name].append(np.asarray(segment.column(name)[rows]))
+            for name in CODED_COLUMNS:
+                parts[name].extend(segment.decode(name, segment.column(name)[rows]))
+        return {
+            name: (np.concatenate(values) if values else np.empty(0, dtype=np.int64))
+            if name in TIME_COLUMNS + ("quantity",) else values
+            for name, values in parts.items()
+        }
+
+    # Те же операции записями в формате storage.parse_history_record.
+    def records_between(self, start, end):
+        columns = self.columns_between(start, end)
+        return list(zip(columns["action"], columns["plate"], columns["arrival"].tolist(), columns["item"],
+                        columns["quantity"].tolist(), columns["start"].tolist(), columns["end"].tolist(),
+                        columns["door"]))
+
+    def time_range(self):
+        segments = self.segments()
+        if not segments:
+            return None
+        return segments[0].first_start, max(segment.last_end for segment in segments)
+
+
+def parse_moment(value):
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Архив истории операций")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="каталог архива")
+    commands = parser.add_subparsers(dest="command", required=True)
+    roll = commands.add_parser("roll", help="перенести закрытые периоды из файла истории в архив")
+    roll.add_argument("--history", default=storage.HISTORY_FILE, help="файл истории")
+    roll.add_argument("--before", help="граница периода (ISO), по умолчанию начало текущих суток")
+    query = commands.add_parser("query", help="вывести операции окна в формате файла истории")
+    query.add_argument("start", help="начало окна (ISO)")
+    query.add_argument("end", help="конец окна (ISO)")
+    args = parser.parse_args()
+
+    archive = HistoryArchive(args.archive)
+    if args.command == "roll":
+        moved = archive.roll(args.history, parse_moment(args.before) if args.before else None)
+        print(f"В архив перенесено операций: {moved}", file=sys.stderr)
+    else:
+        for action, plate, arrival, item, quantity, start, end, door in archive.records_between(
+                parse_moment(args.start), parse_moment(args.end)):
+            sys.stdout.write(storage.format_history_record(action, (plate, arrival, item, quantity), start, end,
+                                                           door))
@@ -0,0 +1,93 @@
+import os
+import time
+from collections import deque
+
+import storage
+
+BUFFER_SIZE = 100
+FLUSH_INTERVAL = 1.0
+
+
+class HistoryReader:
+    """Курсор по свежим записям истории.
+
+    Получает записи прямо от журнала операций, поэтому диаграмме и
+    аналитике не нужно перечитывать файл истории.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+
+    def read_new(self):
+        records = list(self.pending)
+        self.pending.clear()
+        return records
+
+
+class HistoryLogger:
+    """Буферизованная запись истории операций.
+
+    Файл истории открыт все время работы, записи копятся в памяти и
+    сбрасываются на диск при наборе ``buffer_size`` строк, по истечении
+    ``flush_interval`` секунд или при закрытии. С ``fsync=True`` каждый
+    сброс дожидается записи на носитель.
+    """
+
+    def __init__(self, history_file=storage.HISTORY_FILE, buffer_size=BUFFER_SIZE,
+                 flush_interval=FLUSH_INTERVAL, fsync=False):
+        self.history_file = history_file
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.handle = open(history_file, "a", encoding='utf-8')
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.readers = []
+
+    # Читатели получают записи в формате storage.parse_history_record.
+    def log(self, action, data, start_time, end_time, door=None):
+        record = (action, *data, start_time, end_time, door)
+        self.buffer.append(storage.format_history_record(action, data, start_time, end_time, door))
+        for reader in self.readers:
+            reader.pending.append(record)
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        self.handle.write("".join(self.buffer))
+        self.buffer.clear()
+        self.handle.flush()
+        if self.fsync:
+            os.fsync(self.handle.fileno())
+
+    def close(self):
+        if self.handle.closed:
+            return
+        self.flush()
+        self.handle.close()
+
+    # Новый читатель; при from_start сначала получает всю уже записанную историю.
+    def open_reader(self, from_start=True):
+        reader = HistoryReader()
+        if from_start:
+            self.flush()
+            try:
+                reader.pending.extend(storage.read_history_records(self.history_file))
+            except FileNotFoundError:
+                pass
+        self.readers.append(reader)
+        return reader
+
+    def close_reader(self, reader):
+        self.readers.remove(reader)
@@ -0,0 +1,311 @@
+"""Локальный API для пакетной постановки машин в очереди.
+
+Сервер на asyncio работает в фоновом потоке со своим циклом событий и
+слушает только локальный адрес (или Unix-сокет). Состояние симуляции
+меняется только в потоке окна: каждый запрос передается туда через
+диспетчер, а весь пакет ставится в очереди внутри одного
+``persistence.batch()`` и вызывает ``on_change`` один раз — одна запись
+на диск и одно обновление таблиц на пакет.
+
+    POST /unload, POST /load   тело — JSON-массив машин
+                               [{"plate": ..., "item": ..., "quantity": ..., "time_arrived": ...}]
+                               (time_arrived — секунды эпохи, по умолчанию текущий момент;
+                               сборный груз — "lines": [{"item": ..., "quantity": ...}]
+                               вместо item и quantity)
+    GET /state                 очереди и склад
+"""
+import asyncio
+import json
+import queue
+import threading
+import urllib.request
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+import storage
+import timeutil
+
+POLL_MS = 50
+MAX_BODY = 16 * 1024 * 1024
+DIRECTIONS = ("unload", "load")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class IngestError(ValueError):
+    """Пакет отклонен целиком; текст уходит клиенту."""
+
+
+def parse_line(line):
+    if not isinstance(line, dict):
+        raise IngestError("строка груза должна быть объектом")
+    item, quantity = line.get("item"), line.get("quantity")
+    if not isinstance(item, str) or not item:
+        raise IngestError("нужен непустой item")
+    if storage.has_reserved_characters(item):
+        raise IngestError("item не может содержать ';' и переводы строк")
+    if storage.LINE_SEPARATOR in item or storage.QUANTITY_SEPARATOR in item:
+        raise IngestError(f"item не может содержать {storage.LINE_SEPARATOR!r} и {storage.QUANTITY_SEPARATOR!r}")
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+        raise IngestError("quantity должно быть положительным целым")
+    return item, quantity
+
+
+def parse_truck(truck, now):
+    if not isinstance(truck, dict):
+        raise IngestError("машина должна быть объектом")
+    plate = truck.get("plate")
+    if not isinstance(plate, str) or not plate:
+        raise IngestError("нужен непустой plate")
+    if storage.has_reserved_characters(plate):
+        raise IngestError("plate не может содержать ';' и переводы строк")
+    lines = truck.get("lines")
+    if lines is None:
+        item, quantity = parse_line(truck)
+    elif isinstance(lines, list) and lines:
+        item, quantity = storage.format_manifest([parse_line(line) for line in lines])
+    else:
+        raise IngestError("lines — непустой массив строк груза")
+    time_arrived = truck.get("time_arrived", now)
+    if not isinstance(time_arrived, (int, float)) or isinstance(time_arrived, bool):
+        raise IngestError("time_arrived — секунды эпохи")
+    try:
+        time_arrived = timeutil.check_arrival(time_arrived, now)
+    except ValueError:
+        raise IngestError("time_arrived — не дальше года от текущего времени") from None
+    return plate, time_arrived, item, quantity
+
+
+class IngestService:
+    """Операции API над симуляцией; вызывается только в потоке ее владельца."""
+
+    def __init__(self, simulation, persistence=None, on_change=None, clock=timeutil.now):
+        self.simulation = simulation
+        self.persistence = persistence
+        self.on_change = on_change
+        self.clock = clock
+
+    # Пакет проверяется целиком до изменений: ошибка в любой машине отклоняет весь пакет.
+    def enqueue(self, direction, trucks):
+        if direction not in DIRECTIONS:
+            raise IngestError(f"неизвестное направление {direction!r}")
+        if not isinstance(trucks, list):
+            raise IngestError("тело запроса — JSON-массив машин")
+        now = int(self.clock())
+        tasks = []
+        for index, truck in enumerate(trucks):
+            try:
+                tasks.append(parse_truck(truck, now))
+            except IngestError as e:
+                raise IngestError(f"машина {index}: {e}") from None
+        if not tasks:
+            return 0
+
+        target = self.simulation.unload_queue if direction == "unload" else self.simulation.load_queue
+        batch = self.persistence.batch() if self.persistence is not None else nullcontext()
+        with batch:
+            target.extend(tasks)
+        if self.on_change is not None:
+            self.on_change()
+        return len(tasks)
+
+    def state(self):
+        simulation = self.simulation
+        return {
+            "unload": [self.task_json(task) for task in simulation.unload_queue],
+            "load": [self.task_json(task) for task in simulation.load_queue],
+            "warehouse": [{"item": item, "time": time, "quantity": quantity}
+                          for item, (time, quantity) in simulation.warehouse.items()],
+        }
+
+    @staticmethod
+    def task_json(task):
+        plate, time_arrived, item, quantity = task
+        result = {"plate": plate, "time_arrived": time_arrived, "arrived": storage.format_time(time_arrived),
+                  "item": item, "quantity": quantity}
+        if storage.is_manifest(item):
+            result["lines"] = [{"item": name, "quantity": count} for name, count in storage.parse_manifest(item)]
+        return result
+
+
+"""Диспетчеры: выполнение вызова в потоке владельца симуляции"""
+def run_inline(function):
+    future = Future()
+    try:
+        future.set_result(function())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class TkDispatcher:
+    """Передает вызовы в поток Tk через очередь, которую окно разбирает по ``after``."""
+
+    def __init__(self, widget, poll_ms=POLL_MS):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.calls = queue.Queue()
+        self.after_id = self.widget.after(self.poll_ms, self.drain)
+
+    def __call__(self, function):
+        future = Future()
+        self.calls.put((function, future))
+        return future
+
+    def drain(self):
+        while True:
+            try:
+                function, future = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+        self.after_id = self.widget.after(self.poll_ms, self.drain)
+
+    def close(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+
+class IngestServer:
+    """HTTP/1.1 на asyncio в фоновом потоке; по соединению — последовательность запросов."""
+
+    def __init__(self, service, dispatch=run_inline):
+        self.service = service
+        self.dispatch = dispatch
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.writers = set()  # открытые соединения, закрываются при остановке
+
+    # Запускает сервер на 127.0.0.1:port или на Unix-сокете unix_path; возвращает порт.
+    def start(self, port=0, host="127.0.0.1", unix_path=None):
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            try:
+                if unix_path:
+                    self.server = self.loop.run_until_complete(
+                        asyncio.start_unix_server(self.handle, path=unix_path))
+                else:
+                    self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, host, port))
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                self.loop.close()
+                return
+            started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                self.server.close()
+                for writer in list(self.writers):
+                    writer.close()
+                self.loop.run_until_complete(self.server.wait_closed())
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="ingest-api", daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        return None if unix_path else self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        self.loop = None
+
+    """Протокол"""
+    async def handle(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "слишком большой пакет"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/state":
+            if method != "GET":
+                return 405, {"error": "нужен GET"}
+            return 200, await self.call(self.service.state)
+        direction = path.strip("/")
+        if direction not in DIRECTIONS:
+            return 404, {"error": "нет такого адреса"}
+        if method != "POST":
+            return 405, {"error": "нужен POST"}
+        try:
+            trucks = json.loads(body or b"null")
+        except ValueError:
+            return 400, {"error": "тело запроса — не JSON"}
+        try:
+            accepted = await self.call(lambda: self.service.enqueue(direction, trucks))
+        except IngestError as e:
+            return 400, {"error": str(e)}
+        return 200, {"accepted": accepted}
+
+    async def call(self, function):
+        return await asyncio.wrap_future(self.dispatch(function))
+
+    @staticmethod
+    async def respond(writer, status, payload, close=False):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+"""Клиент"""
+def request(url, data=None, timeout=10):
+    body = None if data is None else json.dumps(data, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(url, data=body, method="GET" if data is None else "POST",
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def post_arrivals(port, direction, trucks, host="127.0.0.1"):
+    return request(f"http://{host}:{port}/{direction}", trucks)["accepted"]
+
+
+def get_state(port, host="127.0.0.1"):
+    return request(f"http://{host}:{port}/state")
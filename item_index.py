@@ -0,0 +1,96 @@
+import heapq
+
+import storage
+
+
+class SeqCounter:
+    """Дерево Фенвика над номерами постановки в очередь.
+
+    Номера растут на единицу, поэтому дерево только дописывается в конец.
+    Позволяет за O(log n) узнать, сколько живых записей стоит начиная с
+    заданного номера.
+    """
+
+    def __init__(self, base=0):
+        self.base = base
+        self.tree = [0]
+        self.total = 0
+
+    def prefix(self, position):
+        result = 0
+        while position > 0:
+            result += self.tree[position]
+            position -= position & -position
+        return result
+
+    def grow(self, position):
+        while len(self.tree) <= position:
+            i = len(self.tree)
+            # Узел i хранит сумму (i - lowbit(i), i]; новая позиция пока пустая
+            self.tree.append(self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def add(self, seq, delta):
+        position = seq - self.base
+        self.grow(position)
+        self.total += delta
+        while position < len(self.tree):
+            self.tree[position] += delta
+            position += position & -position
+
+    def count_from(self, seq):
+        return self.total - self.prefix(seq - self.base - 1)
+
+
+class ItemIndex:
+    """Индекс товаров очереди загрузки.
+
+    Подписывается на изменения очереди загрузки и хранит для каждого
+    товара первую машину с ним и число машин, стоящих начиная с нее.
+    Заменяет линейный проход по очереди при расчете приоритета разгрузки.
+    Машина со сборным грузом учитывается в каждом своем товаре.
+    """
+
+    def __init__(self, load_queue):
+        self.load_seqs = {}  # товар -> куча seq машин в очереди загрузки
+        self.load_alive = set()
+        self.load_positions = SeqCounter()
+
+        load_queue.observers.append(self.on_load_change)
+
+        for seq, (_, task) in load_queue.entries.items():
+            self.on_load_change("push", seq, task)
+
+    def on_load_change(self, event, seq, task):
+        if event == "clear":
+            self.load_seqs = {}
+            self.load_alive = set()
+            self.load_positions = SeqCounter()
+            return
+        if event == "push":
+            if not self.load_alive:
+                # Очередь пуста — начинаем счет позиций заново с текущего номера
+                self.load_positions = SeqCounter(seq - 1)
+            for item in storage.item_names(task[2]):
+                heapq.heappush(self.load_seqs.setdefault(item, []), seq)
+            self.load_alive.add(seq)
+            self.load_positions.add(seq, 1)
+        else:
+            self.load_alive.discard(seq)
+            self.load_positions.add(seq, -1)
+
+    def first_load_seq(self, item):
+        seqs = self.load_seqs.get(item)
+        while seqs and seqs[0] not in self.load_alive:
+            heapq.heappop(seqs)
+        if not seqs:
+            self.load_seqs.pop(item, None)
+            return None
+        return seqs[0]
+
+    # Аналог is_item_needed_for_load: длина очереди загрузки минус позиция
+    # первой машины с товаром, 0 если товар не нужен.
+    def needed_for_load(self, item):
+        seq = self.first_load_seq(item)
+        if seq is None:
+            return 0
+        return self.load_positions.count_from(seq)
@@ -0,0 +1,271 @@
+import glob
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import storage
+from simulation import UNLOAD_ACTION
+from timeutil import parse_time
+
+JOURNAL_FILE = "state_journal.txt"
+SNAPSHOT_FILE = "state_snapshot.txt"
+SNAPSHOT_EVERY = 1000
+
+# Виды записей журнала
+ENQUEUE = "enqueue"  # машина встала в очередь
+DEQUEUE = "dequeue"  # машина покинула очередь
+DISPATCH = "dispatch"  # пост начал работу с машиной
+COMPLETE = "complete"  # пост закончил работу с машиной
+STOCK = "stock"  # изменение остатка на складе
+
+# Число полей строки снимка по разделам
+SNAPSHOT_FIELDS = {"unload": 4, "load": 4, "warehouse": 3}
+
+
+class Journal:
+    """Журнал изменений состояния с периодическими снимками.
+
+    Каждое изменение очередей и склада дописывается в журнал одной
+    строкой, вместо перезаписи файлов очередей целиком. Раз в
+    ``snapshot_every`` записей текущий журнал откладывается в сегмент, а
+    снимок состояния пишется в фоновом потоке; после этого сегмент
+    удаляется. При запуске состояние восстанавливается из снимка и всех
+    записей журнала с номером больше номера снимка.
+
+    Время в журнале и снимке пишется секундами эпохи; старые записи со
+    временем "%H:%M:%S" читаются относительно текущего момента симуляции.
+    Поврежденные строки снимка, как и оборванные строки журнала,
+    пропускаются; их номера собираются в ``skipped`` и выводятся в stderr.
+    """
+
+    def __init__(self, journal_file=JOURNAL_FILE, snapshot_file=SNAPSHOT_FILE, snapshot_every=SNAPSHOT_EVERY):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.snapshot_every = snapshot_every
+        self.skipped = []  # (номер строки снимка, текст) пропущенных при восстановлении
+
+        self.seq = 0
+        self.pending = 0
+        self.batching = 0
+        self.handle = None
+        self.simulation = None
+        self.compactor = None
+
+    # Восстанавливает состояние, подключается к симуляции и сразу пишет
+    # снимок, чтобы возвращенные в очередь незавершенные работы не зависели
+    # от старого журнала.
+    def start(self, simulation):
+        self.restore(simulation)
+        self.attach(simulation)
+        self.compact(wait=True)
+
+    """Запись"""
+    def attach(self, simulation):
+        self.simulation = simulation
+        simulation.unload_queue.observers.append(lambda event, seq, task: self.on_queue(event, "unload", task))
+        simulation.load_queue.observers.append(lambda event, seq, task: self.on_queue(event, "load", task))
+        simulation.dispatch_listeners.append(lambda task_type, job: self.append(DISPATCH, task_type, *job))
+        simulation.stock_listeners.append(lambda item, delta, time: self.append(STOCK, item, delta, time or ""))
+        simulation.operation_listeners.append(self.on_operation)
+        self.handle = open(self.journal_file, "a", encoding='utf-8')
+
+    def on_queue(self, event, task_type, task):
+        if event == "push":
+            self.append(ENQUEUE, task_type, *task)
+        elif event == "remove":
+            self.append(DEQUEUE, task_type, *task)
+
+    def on_operation(self, action, data, start_time, end_time, door=None):
+        task_type = "unload" if action == UNLOAD_ACTION else "load"
+        self.append(COMPLETE, task_type, *data)
+
+    def append(self, kind, *fields):
+        self.seq += 1
+        self.handle.write(";".join(map(str, (self.seq, kind) + fields)) + "\n")
+        if not self.batching:
+            self.handle.flush()
+
+        self.pending += 1
+        if self.pending >= self.snapshot_every:
+            self.compact()
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.flush()
+
+    # Записи внутри блока сбрасываются на диск одной записью при выходе из него.
+    @contextmanager
+    def batch(self):
+        self.batching += 1
+        try:
+            yield
+        finally:
+            self.batching -= 1
+            if not self.batching:
+                self.flush()
+
+    """Снимки"""
+    def compact(self, wait=False):
+        if self.compactor is not None and self.compactor.is_alive():
+            if not wait:
+                return
+            self.compactor.join()
+
+        state = self.capture()
+        self.pending = 0
+
+        # Текущий журнал откладывается в сегмент, новые записи идут в чистый файл
+        segment = None
+        if self.handle is not None:
+            self.handle.close()
+            if os.path.exists(self.journal_file):
+                segment = f"{self.journal_file}.{self.seq}"
+                os.replace(self.journal_file, segment)
+            self.handle = open(self.journal_file, "a", encoding='utf-8')
+
+        self.compactor = threading.Thread(target=self.write_snapshot, args=(state, segment))
+        self.compactor.start()
+        if wait:
+            self.compactor.join()
+
+    # Копия состояния на момент последней записи; текущие работы постов
+    # сохраняются как машины в очереди, чтобы после перезапуска их повторить.
+    def capture(self):
+        simulation = self.simulation
+        unload = list(simulation.unload_queue) + simulation.active_jobs("unload")
+        load = list(simulation.load_queue) + simulation.active_jobs("load")
+        warehouse = [(time, item, quantity) for item, (time, quantity) in simulation.warehouse.items()]
+        return self.seq, unload, load, warehouse
+
+    def write_snapshot(self, state, segment=None):
+        seq, unload, load, warehouse = state
+        tmp_file = self.snapshot_file + ".tmp"
+        with open(tmp_file, "w", encoding='utf-8') as f:
+            f.write(f"seq;{seq}\n")
+            for section, records in (("unload", unload), ("load", load), ("warehouse", warehouse)):
+                f.write(f"[{section}]\n")
+                for record in records:
+                    f.write(";".join(map(str, record)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+        if segment is not None:
+            os.remove(segment)
+
+    def close(self):
+        if self.handle is None:
+            return
+        self.compact(wait=True)
+        self.handle.close()
+        self.handle = None
+
+    """Восстановление"""
+    def read_snapshot(self):
+        sections = {"unload": [], "load": [], "warehouse": []}
+        seq = 0
+        self.skipped = []
+        try:
+            with open(self.snapshot_file, "r", encoding='utf-8') as f:
+                section = None
+                for number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if line.startswith("seq;"):
+                        try:
+                            seq = int(line.split(";")[1])
+                        except ValueError:
+                            self.skipped.append((number, line))
+                    elif line.startswith("[") and line.endswith("]"):
+                        section = line[1:-1]
+                    elif line and section in sections:
+                        fields = tuple(line.split(";"))
+                        if len(fields) != SNAPSHOT_FIELDS[section]:
+                            self.skipped.append((number, line))
+                            continue
+                        sections[section].append((number, fields))
+        except FileNotFoundError:
+            return None
+        return seq, sections
+
+    def segments(self):
+        rotated = glob.glob(glob.escape(self.journal_file) + ".*")
+        rotated = [name for name in rotated if name.rsplit(".", 1)[1].isdigit()]
+        rotated.sort(key=lambda name: int(name.rsplit(".", 1)[1]))
+        return rotated + [self.journal_file]
+
+    def read_records(self, after_seq):
+        for name in self.segments():
+            try:
+                with open(name, "r", encoding='utf-8') as f:
+                    for line in f:
+                        parts = line.rstrip("\n").split(";")
+                        if len(parts) < 3 or not parts[0].isdigit():
+                            continue
+                        seq = int(parts[0])
+                        if seq > after_seq:
+                            yield seq, parts[1], parts[2:]
+            except FileNotFoundError:
+                continue
+
+    # Накладывает снимок и хвост журнала на симуляцию, загруженную из файлов очередей.
+    def restore(self, simulation):
+        snapshot = self.read_snapshot()
+        after_seq = 0
+        if snapshot is not None:
+            after_seq, sections = snapshot
+            for task_type, queue in (("unload", simulation.unload_queue), ("load", simulation.load_queue)):
+                queue.clear()
+                for number, fields in sections[task_type]:
+                    try:
+                        queue.push(storage.parse_task(fields, simulation.now))
+                    except ValueError:
+                        self.skipped.append((number, ";".join(fields)))
+            simulation.warehouse = {}
+            for number, (time, item, quantity) in sections["warehouse"]:
+                try:
+                    quantity, time = int(quantity), parse_time(time, simulation.now)
+                except ValueError:
+                    self.skipped.append((number, ";".join((time, item, quantity))))
+                    continue
+                simulation.change_stock(item, quantity, time)
+            for number, line in self.skipped:
+                print(f"{self.snapshot_file}: строка {number} повреждена и пропущена: {line!r}", file=sys.stderr)
+
+        self.seq = after_seq
+        in_progress = []
+        queues = {"unload": simulation.unload_queue, "load": simulation.load_queue}
+        for seq, kind, fields in self.read_records(after_seq):
+            self.seq = seq
+            self.pending += 1
+            # Оборванная при сбое последняя строка пропускается
+            if len(fields) != (3 if kind == STOCK else 5):
+                continue
+            try:
+                if kind == STOCK:
+                    item, delta, time = fields
+                    delta, time = int(delta), parse_time(time, simulation.now) if time else None
+                else:
+                    task_type, task = fields[0], storage.parse_task(fields[1:], simulation.now)
+            except ValueError:
+                continue
+            if kind == STOCK:
+                simulation.change_stock(item, delta, time)
+                continue
+
+            if kind == ENQUEUE:
+                queues[task_type].push(task)
+            elif kind == DEQUEUE:
+                queues[task_type].discard(task)
+            elif kind == DISPATCH:
+                in_progress.append((task_type, task))
+            elif kind == COMPLETE:
+                if (task_type, task) in in_progress:
+                    in_progress.remove((task_type, task))
+                else:
+                    # Работа началась до снимка и попала в него как машина в очереди
+                    queues[task_type].discard(task)
+
+        # Незавершенные работы возвращаются в очередь
+        for task_type, task in in_progress:
+            queues[task_type].push(task)
@@ -0,0 +1,282 @@
+import math
+
+import storage
+from simulation import UNLOAD_ACTION
+
+BIN_GROWTH = 1.05  # ширина корзины гистограммы времени пребывания — 5%
+LOG_GROWTH = math.log(BIN_GROWTH)
+
+
+class DwellHistogram:
+    """Гистограмма времени пребывания с логарифмическими корзинами.
+
+    Каждая запись добавляется за O(1); квантиль ищется по корзинам,
+    число которых ограничено диапазоном значений (около 300 на неделю),
+    с точностью до ширины корзины.
+    """
+
+    def __init__(self):
+        self.bins = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        value = max(0.0, value)
+        index = int(math.log1p(value) / LOG_GROWTH)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                # Верхняя граница корзины
+                return math.expm1((index + 1) * LOG_GROWTH)
+        return math.expm1((max(self.bins) + 1) * LOG_GROWTH)
+
+    """Снимок для сохранения в JSON"""
+    def state(self):
+        return {"bins": sorted(self.bins.items()), "count": self.count, "total": self.total}
+
+    def restore(self, state):
+        self.bins = {index: count for index, count in state["bins"]}
+        self.count = state["count"]
+        self.total = state["total"]
+
+
+class Aggregate:
+    """Накопленные показатели одного среза (направление или товар)."""
+
+    def __init__(self):
+        self.operations = 0
+        self.quantity = 0
+        self.busy = 0.0  # суммарное время работы постов, с
+        self.first_start = None
+        self.last_end = None
+        self.dwell = DwellHistogram()
+
+    def add(self, quantity, arrival, start, end, finished):
+        self.operations += 1
+        self.quantity += quantity
+        self.busy += end - start
+        self.first_start = start if self.first_start is None else min(self.first_start, start)
+        self.last_end = end if self.last_end is None else max(self.last_end, end)
+        if finished:
+            self.dwell.add(end - arrival)
+
+    def state(self):
+        state = {name: value for name, value in vars(self).items() if name != "dwell"}
+        state["dwell"] = self.dwell.state()
+        return state
+
+    def restore(self, state):
+        vars(self).update((name, value) for name, value in state.items() if name != "dwell")
+        self.dwell.restore(state["dwell"])
+
+    def span(self):
+        if self.first_start is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def throughput(self):
+        hours = self.span() / 3600
+        return self.dwell.count / hours if hours else 0.0
+
+
+class StockTurns:
+    """Оборачиваемость товара: отгрузка к среднему запасу за время истории.
+
+    Запас восстанавливается по самой истории (разгрузка прибавляет,
+    загрузка вычитает в момент окончания) начиная с нуля; средний запас —
+    интеграл уровня по времени, деленный на длительность.
+    """
+
+    def __init__(self):
+        self.level = 0
+        self.integral = 0.0
+        self.first_time = None
+        self.last_time = None
+        self.shipped = 0
+
+    def add(self, delta, time):
+        if self.first_time is None:
+            self.first_time = self.last_time = time
+        elif time > self.last_time:
+            self.integral += max(self.level, 0) * (time - self.last_time)
+            self.last_time = time
+        self.level += delta
+        if delta < 0:
+            self.shipped -= delta
+
+    def average(self):
+        if self.first_time is None or self.last_time == self.first_time:
+            return float(max(self.level, 0))
+        return self.integral / (self.last_time - self.first_time)
+
+    def turns(self):
+        average = self.average()
+        return self.shipped / average if average else 0.0
+
+    def state(self):
+        return dict(vars(self))
+
+    def restore(self, state):
+        vars(self).update(state)
+
+
+class KPIEngine:
+    """Потоковые показатели по истории операций.
+
+    Каждая завершенная операция обрабатывается один раз: обновляются
+    накопители по направлениям, товарам и постам, поэтому показатели
+    читаются без пересчета истории. Подключается к симуляции как
+    подписчик ``operation_listeners``; уже записанная история
+    загружается через ``add_record``.
+
+    Машина считается обслуженной после своей последней партии: если
+    ``pending(task_type, plate, time_arrived)`` говорит, что остаток
+    частичной загрузки еще ждет, время пребывания не учитывается. Прошлая
+    история загружается через ``replay``: партии одной машины сводятся в
+    одно время пребывания по концу последней из них.
+
+    ``state``/``restore`` сохраняют накопители в JSON, поэтому закрытая
+    история (``archived_kpis``) не переигрывается при каждом запуске.
+    """
+
+    def __init__(self, pending=None):
+        self.pending = pending
+        self.total = Aggregate()
+        self.directions = {}
+        self.items = {}
+        self.doors = {}  # направление -> множество постов
+        self.stock = {}  # товар -> StockTurns
+
+    def on_operation(self, action, data, start_time, end_time, door=None):
+        self.add_record((action, *data, start_time, end_time, door))
+
+    # Запись в формате storage.parse_history_record; finished=None — узнать у pending.
+    def add_record(self, record, finished=None):
+        action, plate, arrival, item, quantity, start, end, door = record
+        direction = "unload" if action == UNLOAD_ACTION else "load"
+        if finished is None:
+            # Разгрузка не делится на партии, остаток бывает только у загрузки
+            finished = direction == "unload" or self.pending is None or not self.pending(direction, plate, arrival)
+
+        # Сборный груз — одна машина в направлении и в каждом из своих товаров
+        tables = [(direction, quantity, self.directions)]
+        tables += [(name, count, self.items) for name, count in storage.item_lines(item, quantity)]
+        for key, count, table in tables:
+            aggregate = table.get(key)
+            if aggregate is None:
+                aggregate = table[key] = Aggregate()
+            aggregate.add(count, arrival, start, end, finished)
+        self.total.add(quantity, arrival, start, end, finished)
+        self.doors.setdefault(direction, set()).add(door)
+
+        for name, count in storage.item_lines(item, quantity):
+            turns = self.stock.get(name)
+            if turns is None:
+                turns = self.stock[name] = StockTurns()
+            turns.add(count if direction == "unload" else -count, end)
+
+    # Записанная история: операции учитываются сразу, а время пребывания — один раз
+    # на машину (направление, номер, прибытие) по концу ее последней партии.
+    def replay(self, records):
+        trucks = {}  # (направление, номер, прибытие) -> [конец последней партии, товары]
+        for record in records:
+            self.add_record(record, finished=False)
+            action, plate, arrival, item, quantity, _, end, _ = record
+            key = ("unload" if action == UNLOAD_ACTION else "load", plate, arrival)
+            truck = trucks.get(key)
+            if truck is None:
+                truck = trucks[key] = [end, set()]
+            truck[0] = max(truck[0], end)
+            truck[1].update(name for name, _ in storage.item_lines(item, quantity))
+
+        for (direction, plate, arrival), (end, names) in trucks.items():
+            if direction == "load" and self.pending is not None and self.pending(direction, plate, arrival):
+                continue
+            dwell = end - arrival
+            self.total.dwell.add(dwell)
+            self.directions[direction].dwell.add(dwell)
+            for name in names:
+                self.items[name].dwell.add(dwell)
+
+    """Снимок для сохранения в JSON"""
+    def state(self):
+        return {
+            "total": self.total.state(),
+            "directions": {key: aggregate.state() for key, aggregate in self.directions.items()},
+            "items": {key: aggregate.state() for key, aggregate in self.items.items()},
+            "doors": {direction: sorted(doors, key=str) for direction, doors in self.doors.items()},
+            "stock": {item: turns.state() for item, turns in self.stock.items()},
+        }
+
+    def restore(self, state):
+        self.total.restore(state["total"])
+        for table, key in ((self.directions, "directions"), (self.items, "items")):
+            for name, aggregate_state in state[key].items():
+                aggregate = table[name] = Aggregate()
+                aggregate.restore(aggregate_state)
+        self.doors = {direction: set(doors) for direction, doors in state["doors"].items()}
+        for item, turns_state in state["stock"].items():
+            turns = self.stock[item] = StockTurns()
+            turns.restore(turns_state)
+
+    """Чтение показателей"""
+    def summary(self, aggregate):
+        return {
+            "operations": aggregate.operations,
+            "trucks": aggregate.dwell.count,
+            "quantity": aggregate.quantity,
+            "throughput_per_hour": aggregate.throughput(),
+            "dwell_mean": aggregate.dwell.mean(),
+            "dwell_p95": aggregate.dwell.quantile(0.95),
+        }
+
+    # Доля времени, когда посты направления были заняты, от общего окна истории.
+    def utilization(self, direction):
+        aggregate = self.directions.get(direction)
+        span = self.total.span()
+        if aggregate is None or not span:
+            return 0.0
+        return aggregate.busy / (len(self.doors[direction]) * span)
+
+    def direction_kpis(self, direction):
+        kpis = self.summary(self.directions.get(direction, Aggregate()))
+        kpis["utilization"] = self.utilization(direction)
+        return kpis
+
+    def item_kpis(self, item):
+        kpis = self.summary(self.items.get(item, Aggregate()))
+        turns = self.stock.get(item, StockTurns())
+        kpis["inventory_turns"] = turns.turns()
+        kpis["average_stock"] = turns.average()
+        return kpis
+
+    def total_kpis(self):
+        return self.summary(self.total)
+
+
+# Показатели закрытых периодов архива (history_archive.HistoryArchive): снимок из
+# архива плюс доигрывание сегментов, которых в нем еще нет (обычно одни сутки после
+# переноса). Снимок обновляется, так что каждый сегмент переигрывается один раз.
+def archived_kpis(archive, pending=None):
+    engine = KPIEngine(pending)
+    covered, state = archive.read_kpi_checkpoint()
+    if state is not None:
+        engine.restore(state)
+    added = [segment for segment in archive.segments() if segment.name not in covered]
+    for segment in added:
+        engine.replay(segment.records())
+    if added:
+        archive.write_kpi_checkpoint(covered + [segment.name for segment in added], engine.state())
+    return engine
@@ -0,0 +1,236 @@
+"""Планировщик с упреждением для постов разгрузки и загрузки.
+
+Жадная политика (``CrossDockSimulation.calculate_priority``) выбирает
+машину по взвешенной сумме ожидания и признаков товара. Планировщик
+вместо этого перебирает варианты для освободившегося поста — первую по
+прибытию машину каждого товара — и для каждого проигрывает оба вида
+постов вместе на горизонт ``horizon`` секунд: разгрузка в первую
+очередь везет товар, которого не хватает ждущим машинам загрузки, а
+загрузка берет товар со склада, как только он появился. Выбирается
+вариант с наименьшей стоимостью — суммой времени пребывания машин
+плюс ``holding_weight`` за каждую единицу товара на складе в секунду.
+
+Перебор ограничен ``time_budget`` секунд на решение: первым оценивается
+выбор жадной политики, и если время вышло, остается лучший из уже
+оцененных. Подключается так: ``simulation.policy = LookaheadPolicy()``.
+
+Машина со сборным грузом проигрывается одной работой: разгрузка везет
+на склад все ее строки, загрузка берет каждую строку, какая есть.
+"""
+import heapq
+import time
+
+import storage
+
+HORIZON = 2 * 3600
+DEPTH = 10  # машин каждого товара, участвующих в проигрыше
+TIME_BUDGET = 0.02
+HOLDING_WEIGHT = 0.01  # секунд пребывания машины за единицу товара на складе в секунду
+
+
+class Rollout:
+    """Один проигрыш горизонта на упрощенной модели терминала.
+
+    Посты — куча моментов освобождения, склад — остатки без уже
+    обещанного загрузке, разгрузки на постах — будущие поступления.
+    Очереди — первые ``DEPTH`` машин каждой корзины очереди (товара или
+    набора товаров сборного груза) по прибытию; машина
+    загрузки хранится списком ``[номер, прибытие, товар, количество,
+    {товар строки: еще не погружено}]``.
+    """
+
+    def __init__(self, state, end):
+        now, doors, stock, incoming, unload, load, unload_rates, load_rates = state
+        self.now = now
+        self.end = end
+        self.doors = list(doors)
+        self.stock = dict(stock)
+        self.incoming = list(incoming)
+        self.unload = {item: list(tasks) for item, tasks in unload.items()}
+        # Товары очереди разгрузки; у сборного груза их несколько
+        self.unload_names = {item: storage.item_names(item) for item in unload}
+        self.load = {item: [[*task, dict(storage.item_lines(task[2], task[3]))] for task in tasks]
+                     for item, tasks in load.items()}
+        self.needed = {}  # товар -> еще не погружено машинам загрузки
+        for tasks in self.load.values():
+            for task in tasks:
+                for name, count in task[4].items():
+                    self.needed[name] = self.needed.get(name, 0) + count
+        self.unload_rates = unload_rates
+        self.load_rates = load_rates
+
+        self.dwell = 0.0
+        self.holding = 0.0
+        self.level = sum(self.stock.values())
+        self.clock = now
+
+    def advance(self, moment):
+        # Поступления со склада до moment и накопленное время хранения
+        while self.incoming and self.incoming[0][0] <= moment:
+            at, item, quantity = heapq.heappop(self.incoming)
+            self.holding += self.level * (at - self.clock)
+            self.clock = at
+            self.stock[item] = self.stock.get(item, 0) + quantity
+            self.level += quantity
+        if moment > self.clock:
+            self.holding += self.level * (moment - self.clock)
+            self.clock = moment
+
+    def deficit(self, item):
+        incoming = sum(quantity for _, incoming_item, quantity in self.incoming if incoming_item == item)
+        return self.needed.get(item, 0) - self.stock.get(item, 0) - incoming
+
+    def pick_unload(self):
+        best, best_key = None, None
+        for item, tasks in self.unload.items():
+            if not tasks:
+                continue
+            # Сначала товар, которого ждут машины загрузки, затем самая давняя машина
+            covered = True
+            for name in self.unload_names[item]:
+                if self.deficit(name) > 0:
+                    covered = False
+                    break
+            key = (covered, tasks[0][1])
+            if best_key is None or key < best_key:
+                best, best_key = tasks[0], key
+        return best
+
+    def loadable(self, task):
+        for name in task[4]:
+            if self.stock.get(name, 0) > 0:
+                return True
+        return False
+
+    def pick_load(self):
+        best = None
+        for tasks in self.load.values():
+            if tasks and self.loadable(tasks[0]) and (best is None or tasks[0][1] < best[1]):
+                best = tasks[0]
+        return best
+
+    def start_unload(self, moment, task):
+        _, arrival, item, quantity = task
+        self.unload[storage.item_key(item)].remove(task)
+        finish = moment + self.unload_rates.item_duration(item, quantity)
+        for name, count in storage.item_lines(item, quantity):
+            heapq.heappush(self.incoming, (finish, name, count))
+        self.dwell += finish - arrival
+        return finish
+
+    def start_load(self, moment, task):
+        arrival, item, remaining = task[1], task[2], task[4]
+        finish = moment
+        for name, count in list(remaining.items()):
+            taken = min(count, self.stock.get(name, 0))
+            if taken <= 0:
+                continue
+            self.stock[name] -= taken
+            self.level -= taken
+            self.needed[name] -= taken
+            finish += self.load_rates.item_duration(name, taken)
+            if taken == count:
+                del remaining[name]
+            else:
+                remaining[name] = count - taken
+        if not remaining:
+            self.load[storage.item_key(item)].remove(task)
+            self.dwell += finish - arrival
+        return finish
+
+    # Стоимость плана, в котором первый свободный пост task_type берет first.
+    def run(self, task_type, first):
+        forced = first
+        heapq.heapify(self.doors)
+        while self.doors:
+            moment, door_type = heapq.heappop(self.doors)
+            if moment > self.end:
+                break
+            self.advance(moment)
+            if door_type == "unload":
+                task = forced if forced is not None and task_type == "unload" else self.pick_unload()
+                if task is None:
+                    continue
+                heapq.heappush(self.doors, (self.start_unload(moment, task), door_type))
+            else:
+                task = forced if forced is not None and task_type == "load" else self.pick_load()
+                if task is None:
+                    # Пост ждет ближайшего поступления на склад
+                    if self.incoming:
+                        heapq.heappush(self.doors, (self.incoming[0][0], door_type))
+                    continue
+                heapq.heappush(self.doors, (self.start_load(moment, task), door_type))
+            if door_type == task_type:
+                forced = None
+
+        # Машины, не обслуженные за горизонт, ждут как минимум до его конца
+        self.advance(self.end)
+        for queue in (self.unload, self.load):
+            for tasks in queue.values():
+                self.dwell += sum(self.end - task[1] for task in tasks)
+        return self.dwell
+
+
+class LookaheadPolicy:
+    """Выбор машины для свободного поста по проигрышу горизонта вперед."""
+
+    def __init__(self, horizon=HORIZON, depth=DEPTH, time_budget=TIME_BUDGET, holding_weight=HOLDING_WEIGHT):
+        self.horizon = horizon
+        self.depth = depth
+        self.time_budget = time_budget
+        self.holding_weight = holding_weight
+
+    def snapshot(self, simulation):
+        now = simulation.now
+        doors = [(door.end_time if not door.is_free() else now, door.task_type)
+                 for door in simulation.unload_doors + simulation.load_doors]
+        items = set(simulation.warehouse)
+        for queue in (simulation.unload_queue, simulation.load_queue):
+            for item in queue.buckets:
+                items.update(storage.item_names(item))
+        stock = {item: max(0, simulation.available_quantity(item)) for item in items}
+        incoming = [(door.end_time, name, count) for door in simulation.unload_doors if not door.is_free()
+                    for name, count in storage.item_lines(door.job[2], door.job[3])]
+        heapq.heapify(incoming)
+        unload = {item: simulation.unload_queue.earliest(item, self.depth) for item in simulation.unload_queue.buckets}
+        load = {item: simulation.load_queue.earliest(item, self.depth) for item in simulation.load_queue.buckets}
+        return now, doors, stock, incoming, unload, load, simulation.unload_times, simulation.load_times
+
+    def cost(self, state, task_type, task):
+        rollout = Rollout(state, state[0] + self.horizon)
+        if task_type == "load":
+            task = next(candidate for candidate in rollout.load[storage.item_key(task[2])] if tuple(candidate[:4]) == task)
+        return rollout.run(task_type, task) + self.holding_weight * rollout.holding
+
+    # Машина для свободного поста task_type или None, если ставить некого.
+    def choose(self, simulation, task_type):
+        queue = simulation.unload_queue if task_type == "unload" else simulation.load_queue
+        greedy = queue.peek()
+        if greedy is None:
+            return None
+
+        state = self.snapshot(simulation)
+        _, _, stock, _, unload, load, _, _ = state
+        if task_type == "unload":
+            options = [tasks[0] for tasks in unload.values() if tasks]
+        else:
+            options = [tasks[0] for tasks in load.values()
+                       if tasks and any(stock.get(name, 0) > 0 for name, _ in storage.item_lines(*tasks[0][2:]))]
+        if not options:
+            return None
+        # Жадный выбор оценивается первым и остается при равной стоимости
+        if greedy in options:
+            options.remove(greedy)
+            options.insert(0, greedy)
+        if len(options) == 1:
+            return options[0]
+
+        deadline = time.perf_counter() + self.time_budget
+        best, best_cost = None, None
+        for task in options:
+            cost = self.cost(state, task_type, task)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = task, cost
+            if time.perf_counter() > deadline:
+                break
+        return best
@@ -1,52 +1,100 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pandas as pd
+
+import history_archive
+import storage
+import timeutil
+from history_log import HistoryLogger
+from journal import Journal
+import kpi
+from kpi import KPIEngine
+from lookahead import LookaheadPolicy
+from metrics import Metrics
+from perf_panel import PerfPanel
+from simulation import CrossDockSimulation
+from sqlite_storage import SQLiteStorage
+from table_view import TableView
+from timers import TimerService
+
+METRICS_INTERVAL_MS = 5000
+GANTT_DELAY_MS = 100  # диаграмма открывается после того, как окно очередей нарисовано
+HISTORY_DELAY_MS = 50  # прошлая история для показателей читается после показа окна
 
 class CrossDockApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, database=None, unload_doors=1, load_doors=1, perf_panel=False, metrics_file=None,
+                 metrics_port=None, ingest_port=None, ingest_socket=None, show_gantt=True,
+                 lookahead=False):
         super().__init__()
 
         self.title("Cross-Dock Management")
         self.geometry("1745x800")
 
-        self.unload_file = "unload_queue.txt"
-        self.load_file = "load_queue.txt"
-        self.warehouse_file = "warehouse.txt"
-        self.unload_times_file = "unload_times.txt"
-        self.load_times_file = "load_times.txt"
-        self.history_file = "history_of_actions.txt"
-
-        self.unload_queue = []
-        self.load_queue = []
-        self.warehouse = {}
-
-
-        self.current_unload = None
-        self.current_load = None
-
-        self.unload_start_time = None
-        self.unload_end_time = None
-        self.load_start_time = None
-        self.load_end_time = None
+        self.unload_file = storage.UNLOAD_FILE
+        self.load_file = storage.LOAD_FILE
+        self.warehouse_file = storage.WAREHOUSE_FILE
+        self.unload_times_file = storage.UNLOAD_TIMES_FILE
+        self.load_times_file = storage.LOAD_TIMES_FILE
+        self.history_file = storage.HISTORY_FILE
+
+        # Вся логика кросс-докинга живет в симуляции, окно только отображает ее состояние
+        self.simulation = CrossDockSimulation(unload_doors=unload_doors, load_doors=load_doors)
+        self.simulation.operation_listeners.append(self.on_operation_completed)
+        if lookahead:
+            self.simulation.policy = LookaheadPolicy()
+        # Замеры горячих путей; методы подменяются до того, как на них сошлются таймеры
+        self.metrics = Metrics()
+        self.metrics.instrument(self.simulation, ("start_unload", "start_load"))
+        self.metrics.instrument(self, ("update_operation_status", "update_gantt_chart", "save_data", "update_table"))
+        self.metrics_file = metrics_file
+        self.metrics_after_id = None
+        if metrics_port:
+            self.metrics.serve(metrics_port)
+        # Изменения состояния дописываются в журнал (или в базу SQLite), файлы не перезаписываются целиком
+        self.persistence = SQLiteStorage(database) if database else Journal()
+        self.database = database
+        # Закрытые сутки истории переносятся в колоночный архив до того, как файл откроется на запись
+        self.archive = history_archive.HistoryArchive() if history_archive.numpy_available() else None
+        if self.archive is not None:
+            self.archive.roll(self.history_file)
+        self.history = HistoryLogger(self.history_file)
+        # Очереди загружаются до показателей: по ним видно, какие машины еще не догружены
+        self.load_data()
+        # Показатели считаются по мере завершения операций; прошлая история читается один раз
+        self.kpi = KPIEngine(self.simulation.is_pending)
+        self.kpi_loaded = False
+        self.simulation.operation_listeners.append(self.kpi.on_operation)
+        self.after(HISTORY_DELAY_MS, self.load_kpi_history)
+        self.flush_after_id = None
+        # Таймер на ближайшее завершение работы вместо ежесекундного опроса
+        self.timers = TimerService(self, self.simulation, self.update_operation_status)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Окно диаграммы и matplotlib загружаются при первом открытии, а не при запуске
+        self.gantt_window = None
+        self.gantt_view = None
+        self.gantt_chart = None
+        self.gantt_reader = None
 
-        self.unload_times = []
-        self.load_times = []
+        self.create_widgets()
+        if perf_panel:
+            PerfPanel(self, self.metrics)
 
-        self.gantt_window = tk.Toplevel(self)
-        self.gantt_window.title("Диаграмма Ганта")
-        self.gantt_window.geometry("1200x600")
+        self.timers.wake()
+        self.export_metrics()
 
-        self.gantt_ax = None
-        self.update_gantt_chart()
+        # Пакеты машин от внешних систем; каждый пакет — одна запись на диск и одно обновление окна
+        self.ingest_server = None
+        if ingest_port or ingest_socket:
+            from ingest_api import IngestServer, IngestService, TkDispatcher
 
-        self.load_data()
-        self.create_widgets()
-        self.update_operation_status()
+            service = IngestService(self.simulation, self.persistence, on_change=self.timers.wake)
+            self.ingest_dispatcher = TkDispatcher(self)
+            self.ingest_server = IngestServer(service, self.ingest_dispatcher)
+            self.ingest_server.start(port=ingest_port or 0, unix_path=ingest_socket)
 
-        self.simulate_cross_docking()
+        if show_gantt:
+            self.after(GANTT_DELAY_MS, self.open_gantt)
 
     def create_widgets(self):
         tk.Label(self, text="Очередь на разгрузку", font=("Arial", 14)).grid(row=0, column=0, padx=10, pady=10)
@@ -61,6 +109,11 @@ class CrossDockApp(tk.Tk):
         self.warehouse_table = self.create_table(("№", "Время разгрузки", "Товар", "Количество"))
         self.warehouse_table.grid(row=1, column=2, padx=10, pady=10)
 
+        # Таблицы обновляются по ключам строк, а длинные очереди подгружаются страницами
+        self.unload_view = TableView(self.unload_table, lambda: self.queue_rows(self.simulation.unload_queue))
+        self.load_view = TableView(self.load_table, lambda: self.queue_rows(self.simulation.load_queue))
+        self.warehouse_view = TableView(self.warehouse_table, self.warehouse_rows)
+
         self.create_input_fields()
 
         self.unload_status = tk.Label(self, text="На разгрузке: -", font=("Arial", 12))
@@ -69,13 +122,10 @@ class CrossDockApp(tk.Tk):
         self.load_status = tk.Label(self, text="На загрузке: -", font=("Arial", 12))
         self.load_status.grid(row=3, column=1, pady=10)
 
-        self.update_table(self.unload_table, self.unload_queue)
-        self.update_table(self.load_table, self.load_queue)
-        self.update_warehouse_table()
+        self.kpi_status = tk.Label(self, text="", font=("Arial", 12), justify=tk.LEFT)
+        self.kpi_status.grid(row=3, column=2, pady=10)
 
-        fig, self.gantt_ax = plt.subplots(figsize=(12, 8))
-        self.gantt_canvas = FigureCanvasTkAgg(fig, master=self.gantt_window)
-        self.gantt_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.refresh_view()
 
     def create_input_fields(self):
         input_frame = tk.Frame(self)
@@ -113,139 +163,68 @@ class CrossDockApp(tk.Tk):
                                                                                            columnspan=2, pady=5)
         tk.Button(input_frame, text="Разгрузить", command=self.start_unload).grid(row=1, column=4, pady=5)
         tk.Button(input_frame, text="Загрузить", command=self.start_load).grid(row=1, column=5, pady=5)
+        tk.Button(input_frame, text="Диаграмма Ганта", command=self.open_gantt).grid(row=1, column=6, padx=5,
+                                                                                      pady=5)
 
     """Работа с файлами"""
     def load_data(self):
-        self.unload_queue = self.read_from_file(self.unload_file)
-        self.load_queue = self.read_from_file(self.load_file)
-        warehouse_data = self.read_from_file(self.warehouse_file, is_warehouse=True)
-        self.unload_times = self.read_times_from_file(self.unload_times_file)
-        self.load_times = self.read_times_from_file(self.load_times_file)
-
-        for time, item, quantity in warehouse_data:
-            if item in self.warehouse:
-                prev_time, prev_quantity = self.warehouse[item]
-                self.warehouse[item] = (prev_time, prev_quantity + quantity)
-            else:
-                self.warehouse[item] = (time, quantity)
-
-    def read_from_file(self, filename, is_warehouse=False):
-        data = []
-        try:
-            with open(filename, "r", encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split(";")
-                    if len(parts) == 4 and not is_warehouse:
-                        data.append((parts[0], parts[1], parts[2], int(parts[3])))
-                    elif len(parts) == 3 and is_warehouse:
-                        data.append((parts[0], parts[1], int(parts[2])))
-        except FileNotFoundError:
-            pass
-        return data
-
-    def read_times_from_file(self, filename):
-        times = []
-        try:
-            with open(filename, "r", encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split(";")
-                    if len(parts) == 2:
-                        times.append((parts[0], parts[1]))
-        except FileNotFoundError:
-            pass
-        return times
+        self.simulation.load_data(self.unload_file, self.load_file, self.warehouse_file,
+                                  self.unload_times_file, self.load_times_file)
+        self.persistence.start(self.simulation)
 
     def save_data(self):
-        self.write_to_file(self.unload_file, self.unload_queue)
-        self.write_to_file(self.load_file, self.load_queue)
-        warehouse_data = [
-            (time, item, quantity) for item, (time, quantity) in self.warehouse.items()
-        ]
-        self.write_to_file(self.warehouse_file, warehouse_data)
-
-        self.save_times_to_file(self.unload_times_file, self.unload_times)
-        self.save_times_to_file(self.load_times_file, self.load_times)
-
-    def write_to_file(self, filename, data):
-        with open(filename, "w", encoding='utf-8') as f:
-            for record in data:
-                f.write(";".join(map(str, record)) + "\n")
-
-    def save_times_to_file(self, filename, times):
-        with open(filename, "w", encoding='utf-8') as f:
-            for record in times:
-                f.write(";".join(map(str, record)) + "\n")
-
-    def read_history_from_file(self):
-        data = []
-        with open('history_of_actions.txt', 'r', encoding='utf-8') as file:
-            for line in file:
-                parts = line.strip().split(';')
-                data.append(tuple(parts))
-        return data
+        self.persistence.flush()
 
     """Диаграмма Ганта"""
-    def update_gantt_chart(self):
-        if not hasattr(self, 'gantt_canvas'):
+    def open_gantt(self):
+        if self.gantt_window is not None:
+            self.gantt_window.deiconify()
+            self.gantt_window.lift()
             return
-        data = self.read_history_from_file()
-
-        columns = ["Operation", "Vehicle", "Time", "Item", "Quantity", "Start", "End"]
-        df = pd.DataFrame(data, columns=columns)
-
-        df["Start"] = pd.to_datetime(df["Start"], format="%H:%M:%S")
-        df["End"] = pd.to_datetime(df["End"], format="%H:%M:%S")
-
-        df["Duration"] = (df["End"] - df["Start"]).dt.total_seconds()
-
-        earliest_start = df["Start"].min()
-        df["Relative Start"] = (df["Start"] - earliest_start).dt.total_seconds()
-
-        product_colors = {
-            "Товар 1": "green",
-            "Товар 2": "blue",
-            "Товар 3": "red",
-        }
-
-        df["Color"] = df["Item"].map(product_colors).fillna("gray")  # Default to gray if product is not defined
-
-        if self.gantt_ax is None:
-            self.gantt_ax = plt.subplots(figsize=(12, 8))
-
-        self.gantt_ax.clear()
-        operations = df["Operation"].unique()
-        for _, operation in enumerate(operations):
-            operation_data = df[df["Operation"] == operation]
-            for _, row in operation_data.iterrows():
-                self.gantt_ax.barh(
-                    operation,
-                    row["Duration"],
-                    left=row["Relative Start"],
-                    color=row["Color"],
-                    edgecolor="black",
-                )
-
-        plt.xlabel("Время (HH:MM:SS)")
-        plt.ylabel("Операция")
-        plt.title("Диаграмма Ганта")
+        # matplotlib и NumPy нужны только диаграмме
+        from gantt import GanttChart
+        from gantt_render import GanttView
 
-        time_labels = pd.to_timedelta(self.gantt_ax.get_xticks(), unit='s') + earliest_start
-        filtered_labels = [label.time() if pd.notna(label) else None for label in time_labels]
-
-        self.gantt_ax.set_xticks(self.gantt_ax.get_xticks())
-        self.gantt_ax.set_xticklabels([str(label) if label is not None else '' for label in filtered_labels])
+        self.gantt_window = tk.Toplevel(self)
+        self.gantt_window.title("Диаграмма Ганта")
+        self.gantt_window.geometry("1200x600")
+        self.gantt_window.protocol("WM_DELETE_WINDOW", self.close_gantt)
+
+        # Диаграмма рисуется в фоновом потоке, окно только подменяет готовые кадры
+        self.gantt_view = GanttView(self.gantt_window)
+        self.gantt_view.pack(fill=tk.BOTH, expand=True)
+        # С базой прошлая история читается из нее по окну, от журнала — только новые записи
+        self.gantt_reader = self.history.open_reader(from_start=not self.database)
+        self.gantt_chart = GanttChart(self.gantt_view, reader=self.gantt_reader,
+                                      archive=self.persistence if self.database else self.archive)
+        self.update_gantt_chart()
 
-        handles = [plt.Line2D([0], [0], color=color, lw=4) for color in product_colors.values()]
-        labels = list(product_colors.keys())
-        self.gantt_ax.legend(handles, labels, title="Товары")
+    def close_gantt(self):
+        if self.gantt_window is None:
+            return
+        self.gantt_view.close()
+        self.history.close_reader(self.gantt_reader)
+        self.gantt_window.destroy()
+        self.gantt_window = self.gantt_view = self.gantt_chart = self.gantt_reader = None
 
-        self.gantt_canvas.draw()
+    def update_gantt_chart(self):
+        if self.gantt_chart is None:
+            return
+        self.gantt_chart.refresh()
 
     def get_car_data(self):
         plate = self.plate_combobox.get()
         item = self.item_combobox.get()
         quantity = self.quantity_entry.get()
 
+        # Сборный груз вводится в поле товара строкой "Товар 1=5|Товар 2=3",
+        # количество тогда считается по строкам
+        if storage.is_manifest(item):
+            try:
+                item, quantity = storage.format_manifest(storage.parse_manifest(item))
+            except ValueError:
+                return None
+
         if not plate or not item or not quantity:
             return None
 
@@ -254,25 +233,23 @@ class CrossDockApp(tk.Tk):
         except ValueError:
             return None
 
-        time_arrived = datetime.now().strftime("%H:%M:%S")
+        time_arrived = int(timeutil.now())
         self.clear_input_fields()
         return (plate, time_arrived, item, quantity)
 
     def add_to_unload(self):
         car_data = self.get_car_data()
         if car_data:
-            self.unload_queue.append(car_data)
-            self.update_table(self.unload_table, self.unload_queue)
+            self.simulation.add_to_unload(car_data)
             self.clear_input_fields()
-            self.save_data()
+            self.timers.wake()
 
     def add_to_load(self):
         car_data = self.get_car_data()
         if car_data:
-            self.load_queue.append(car_data)
-            self.update_table(self.load_table, self.load_queue)
+            self.simulation.add_to_load(car_data)
             self.clear_input_fields()
-            self.save_data()
+            self.timers.wake()
 
     def create_table(self, columns):
         table = ttk.Treeview(self, columns=columns, show="headings")
@@ -281,167 +258,174 @@ class CrossDockApp(tk.Tk):
             table.column(col, width=93)
         return table
 
-    def update_table(self, table, data):
-        table.delete(*table.get_children())
-        for i, entry in enumerate(data, start=1):
-            table.insert("", "end", values=(i, *entry))
-
-    """Работа со складом"""
-    def update_warehouse_table(self):
-        self.warehouse_table.delete(*self.warehouse_table.get_children())
-        for i, (item, (time, quantity)) in enumerate(self.warehouse.items(), start=1):
-            self.warehouse_table.insert("", "end", values=(i, time, item, quantity))
-
-    """Оценка приоритетов с учетом взвешенных факторов"""
-    def calculate_priority(self, task, task_type):
-        _, time_arrived, item, _ = task
-        waiting_time = (datetime.now() - datetime.strptime(time_arrived, "%H:%M:%S")).seconds
-
-        weights = {
-            "waiting_time": 2.0,  # Срочность
-            "dependency": 3.0,   # Зависимость
-            "availability": 1.0,  # Доступность
-        }
-
-        dependency_score, availability_score = 0, 0
-        waiting_score = waiting_time * weights["waiting_time"]
-
-        if task_type == "unload":
-            dependency_score = self.is_item_needed_for_load(item) * weights["dependency"]
-        elif task_type == "load":
-            availability_score = self.is_item_available_in_warehouse(item) * weights["availability"]
-
-        priority = dependency_score + waiting_score + availability_score
-        return priority
-
+    def update_table(self, view):
+        view.refresh()
 
-    # Проверяет, нужен ли товар для задач на загрузку, и возвращает его индекс в очереди загрузки.
-    def is_item_needed_for_load(self, item):
-        for index, load_item in enumerate(self.load_queue):
-            if load_item[2] == item:
-                return len(self.load_queue) - index
-        return 0
+    def queue_rows(self, queue):
+        return len(queue), ((seq, self.task_row(task)) for seq, task in queue.items())
 
-    # Возвращает True, если товар есть на складе в достаточном количестве.
-    def is_item_available_in_warehouse(self, item):
-        return item in self.warehouse and self.warehouse[item][1] > 0
+    @staticmethod
+    def task_row(task):
+        plate, time_arrived, item, quantity = storage.format_task(task)
+        return plate, time_arrived, storage.describe_item(item), quantity
 
-    """Разгрузка с улучшенным приоритетом"""
-    def start_unload(self):
-        if self.current_unload is None and self.unload_queue:
-            self.unload_start_time = datetime.now().strftime("%H:%M:%S")
-            
-            self.unload_queue.sort(key=lambda x: self.calculate_priority(x, "unload"), reverse=True)
-            
-            self.current_unload = self.unload_queue.pop(0)
-            self.unload_end_time = (datetime.strptime(self.unload_start_time, "%H:%M:%S") + self.calculate_unload_time()).strftime("%H:%M:%S")
-            self.update_table(self.unload_table, self.unload_queue)
-            self.unload_status.config(text=f"На разгрузке: {self.current_unload[0]}; {self.current_unload[2]}; {self.current_unload[3]}")
-
-    def calculate_unload_time(self):
-        for i in range(0, len(self.unload_times)):
-            if self.current_unload[2] == self.unload_times[i][0]:
-                time = int(self.current_unload[3]) * int(self.unload_times[i][1])
-                return timedelta(seconds=time)
-        return timedelta(seconds=0)
-
-    """Загрузка с улучшенным приоритетом"""
-    def start_load(self):
-        if self.current_load is None and self.load_queue:
-            self.load_start_time = datetime.now().strftime("%H:%M:%S")
-            
-            self.load_queue.sort(key=lambda x: self.calculate_priority(x, "load"), reverse=True)
-            
-            self.current_load = self.load_queue.pop(0)
-            plate, time_arrived, item, quantity = self.current_load
-
-            if item in self.warehouse:
-                if self.warehouse[item][1] >= quantity:
-                    self.load_end_time = (datetime.strptime(self.load_start_time, "%H:%M:%S") + self.calculate_load_time()).strftime("%H:%M:%S")
-                    self.update_table(self.load_table, self.load_queue)
-                    self.load_status.config(text=f"На загрузке: {plate}; {item}; {quantity}")
-                else:
-                    new_quantity = self.warehouse[item][1]
-                    self.current_load = (plate, time_arrived, item, new_quantity)
-                    self.load_end_time = (datetime.strptime(self.load_start_time, "%H:%M:%S") + self.calculate_load_time()).strftime("%H:%M:%S")
-                    print(self.load_start_time, self.calculate_load_time())
-                    self.update_table(self.load_table, self.load_queue)
-                    self.load_status.config(text=f"На загрузке: частично {plate}; {item}; {new_quantity}")
-
-                    self.load_queue.append((plate, time_arrived, item, quantity - new_quantity))
-                    self.update_table(self.load_table, self.load_queue)
+    """Работа со складом"""
+    def update_warehouse_table(self):
+        self.update_table(self.warehouse_view)
+
+    def warehouse_rows(self):
+        warehouse = self.simulation.warehouse
+        return len(warehouse), ((item, (storage.format_time(time), item, quantity)) for item, (time, quantity) in warehouse.items())
+
+    def door_status(self, door, label, several, waiting=False):
+        if several:
+            label = f"{label} (пост {door.number})"
+        if door.is_free():
+            return f"{label}: {'ожидание товара' if waiting else '-'}"
+        plate, _, item, quantity = door.job
+        partial = "частично " if door.partial else ""
+        return f"{label}: {partial}{plate}; {storage.describe_item(item)}; {quantity}"
+
+    def update_status_labels(self):
+        simulation = self.simulation
+        unload_doors, load_doors = simulation.unload_doors, simulation.load_doors
+        self.unload_status.config(text="\n".join(
+            self.door_status(door, "На разгрузке", len(unload_doors) > 1) for door in unload_doors))
+        self.load_status.config(text="\n".join(
+            self.door_status(door, "На загрузке", len(load_doors) > 1, simulation.load_waiting)
+            for door in load_doors))
+
+    def refresh_view(self):
+        self.update_table(self.unload_view)
+        self.update_table(self.load_view)
+        self.update_warehouse_table()
+        self.update_status_labels()
+        self.update_kpi_label()
+
+    """Показатели"""
+    # Прошлая история — снимок показателей закрытых суток из архива (или базы) и
+    # доигрывание того, что записано после него: файла текущих суток или новых строк
+    # базы. Чтение архива загружает NumPy, поэтому идет после показа окна; операции,
+    # завершенные до этого, уже записаны, и показатели собираются заново, а затем
+    # подменяют текущие.
+    def load_kpi_history(self):
+        if self.database:
+            # С базой вся история, включая текущие сутки, — в ней
+            engine = KPIEngine(self.simulation.is_pending)
+            last_id, state = self.persistence.read_kpi_checkpoint()
+            if state is not None:
+                engine.restore(state)
+            _, records = self.persistence.history_after(last_id)
+            engine.replay(records)
+            self.persistence.write_kpi_checkpoint(engine.state())
+        else:
+            if self.archive is not None:
+                engine = kpi.archived_kpis(self.archive, self.simulation.is_pending)
             else:
-                self.load_queue.insert(0, self.current_load)
-                self.current_load = None
-                self.load_status.config(text="На загрузке: ожидание товара")
+                engine = KPIEngine(self.simulation.is_pending)
+            reader = self.history.open_reader()
+            engine.replay(reader.read_new())
+            self.history.close_reader(reader)
+
+        self.simulation.operation_listeners.remove(self.kpi.on_operation)
+        self.kpi = engine
+        self.kpi_loaded = True
+        self.simulation.operation_listeners.append(engine.on_operation)
+        self.update_kpi_label()
+
+    def update_kpi_label(self):
+        total = self.kpi.total_kpis()
+        unload, load = self.kpi.direction_kpis("unload"), self.kpi.direction_kpis("load")
+        self.kpi_status.config(text=(
+            f"Машин в час: {total['throughput_per_hour']:.1f}\n"
+            f"На терминале: в среднем {total['dwell_mean'] / 60:.0f} мин, p95 {total['dwell_p95'] / 60:.0f} мин\n"
+            f"Занятость постов: разгрузка {unload['utilization']:.0%}, загрузка {load['utilization']:.0%}"))
+
+    """Разгрузка и загрузка выполняются симуляцией по реальным часам"""
+    def start_unload(self):
+        self.simulation.advance_to(timeutil.now())
+        self.simulation.start_unload()
+        self.update_operation_status()
+        self.timers.schedule()
 
-    def calculate_load_time(self):
-        for i in range(0, len(self.load_times)):
-            if self.current_load[2] == self.load_times[i][0]:
-                time = int(self.current_load[3]) * int(self.load_times[i][1])
-                return timedelta(seconds=time)
-        return timedelta(seconds=0)
+    def start_load(self):
+        self.simulation.advance_to(timeutil.now())
+        self.simulation.start_load()
+        self.update_operation_status()
+        self.timers.schedule()
 
     """Обновление всех данных программы, логирование процессов"""
+    # Вызывается таймером только когда состояние симуляции изменилось.
     def update_operation_status(self):
-        now = datetime.now().strftime("%H:%M:%S")
+        self.refresh_view()
+        self.update_gantt_chart()
+        self.schedule_flush()
 
-        if self.current_unload and now >= self.unload_end_time:
-            _, _, item, quantity = self.current_unload
-            if item in self.warehouse:
-                current_quantity = self.warehouse[item][1]
-                self.warehouse[item] = (now, current_quantity + quantity)
-            else:
-                self.warehouse[item] = (now, quantity)
-
-            self.update_warehouse_table()
-            self.log_operation("Завершена разгрузка", self.current_unload, self.unload_start_time, 
-                               self.unload_end_time)
-            self.current_unload = None
-            self.unload_status.config(text="На разгрузке: -")
-            self.save_data()
-
-            self.after(1000, self.start_unload)
-
-        if self.current_load and self.load_end_time is not None and now >= self.load_end_time:
-            _, _, item, quantity = self.current_load
-            if item in self.warehouse and self.warehouse[item][1] >= quantity:
-                self.warehouse[item] = (self.warehouse[item][0], self.warehouse[item][1] - quantity)
-                if self.warehouse[item][1] == 0:
-                    del self.warehouse[item]
-            self.update_warehouse_table()
-            self.update_table(self.load_table, self.load_queue)
-            self.log_operation("Завершена загрузка", self.current_load, self.load_start_time, 
-                               self.load_end_time)
-            self.current_load = None
-            self.load_status.config(text="На загрузке: -")
-            self.save_data()
-
-            self.after(1000, self.start_load)
+    # Сброс журнала и истории на диск откладывается и объединяет изменения за интервал.
+    def schedule_flush(self):
+        if self.flush_after_id is None:
+            self.flush_after_id = self.after(int(self.history.flush_interval * 1000), self.flush_pending)
 
-        self.update_gantt_chart()
-        self.after(1000, self.update_operation_status)
+    def flush_pending(self):
+        self.flush_after_id = None
+        self.save_data()
+        self.history.flush()
+
+    def on_operation_completed(self, action, data, start_time, end_time, door=None):
+        self.log_operation(action, data, start_time, end_time, door)
 
-    def log_operation(self, action, data, start_time, end_time):
-        with open(self.history_file, "a", encoding='utf-8') as f:
-            f.write(f"{action};{';'.join(map(str, data))};{start_time};{end_time}\n")
+    def log_operation(self, action, data, start_time, end_time, door=None):
+        self.history.log(action, data, start_time, end_time, door)
+
+    # Метрики периодически сбрасываются в файл для внешнего сборщика.
+    def export_metrics(self):
+        if not self.metrics_file:
+            return
+        self.metrics.write_file(self.metrics_file)
+        self.metrics_after_id = self.after(METRICS_INTERVAL_MS, self.export_metrics)
+
+    def on_close(self):
+        if self.ingest_server is not None:
+            self.ingest_server.close()
+            self.ingest_dispatcher.close()
+        self.timers.cancel()
+        if self.metrics_after_id is not None:
+            self.after_cancel(self.metrics_after_id)
+        # Снимок показателей до закрытия базы; без доигранной истории он был бы неполным
+        if self.database and self.kpi_loaded:
+            self.persistence.write_kpi_checkpoint(self.kpi.state())
+        self.persistence.close()
+        self.history.close()
+        self.close_gantt()
+        if self.metrics_file:
+            self.metrics.write_file(self.metrics_file)
+        self.metrics.close()
+        self.destroy()
 
     def clear_input_fields(self):
         self.plate_combobox.set("")
         self.item_combobox.set("")
         self.quantity_entry.delete(0, tk.END)
 
-    """Запуск симуляции кросс-докинга"""
-    def simulate_cross_docking(self):
-        if self.current_unload is None and self.unload_queue:
-            self.after(1000, self.start_unload)
-        if self.current_load is None and self.load_queue:
-            self.after(1000, self.start_load)
-
-        self.after(1000, self.simulate_cross_docking)
-
 
 if __name__ == "__main__":
-    app = CrossDockApp()
+    parser = argparse.ArgumentParser(description="Моделирование процесса кросс-докинга")
+    parser.add_argument("--db", help="хранить состояние в базе SQLite вместо текстовых файлов")
+    parser.add_argument("--unload-doors", type=int, default=1, help="число постов разгрузки")
+    parser.add_argument("--load-doors", type=int, default=1, help="число постов загрузки")
+    parser.add_argument("--perf-panel", action="store_true", help="показать окно с временем горячих путей")
+    parser.add_argument("--metrics-file", help="сохранять метрики в файл в формате Prometheus")
+    parser.add_argument("--metrics-port", type=int, help="отдавать метрики по http://127.0.0.1:порт/metrics")
+    parser.add_argument("--ingest-port", type=int, help="принимать пакеты машин по http://127.0.0.1:порт")
+    parser.add_argument("--ingest-socket", help="принимать пакеты машин через Unix-сокет")
+    parser.add_argument("--lookahead", action="store_true",
+                        help="выбирать машины планировщиком с упреждением вместо жадного приоритета")
+    parser.add_argument("--no-gantt", action="store_true", help="не открывать диаграмму Ганта при запуске")
+    args = parser.parse_args()
+
+    app = CrossDockApp(database=args.db, unload_doors=args.unload_doors, load_doors=args.load_doors,
+                       perf_panel=args.perf_panel, metrics_file=args.metrics_file, metrics_port=args.metrics_port,
+                       ingest_port=args.ingest_port, ingest_socket=args.ingest_socket, show_gantt=not args.no_gantt,
+                       lookahead=args.lookahead)
     app.mainloop()
 
@@ -0,0 +1,297 @@
+"""Потоковый импорт манифестов прибытия из JSONL и CSV.
+
+Файл читается построчно генератором и никогда не загружается целиком:
+каждая строка проверяется, гос. номер и товар приводятся к одному виду,
+а машины ставятся в очереди пачками по ``chunk_size`` — каждая пачка
+внутри одного ``persistence.batch()``. Ошибочные строки пропускаются и
+учитываются в отчете (или прерывают импорт с ``strict=True``).
+
+Поля строки: ``plate``, ``item``, ``quantity``, необязательные
+``direction`` (unload/load, разгрузка/загрузка) и ``time_arrived``
+(секунды эпохи, "%H:%M:%S" или дата ISO; по умолчанию — момент импорта).
+В CSV первая строка — заголовок с этими именами, разделитель ``,`` или ``;``.
+Сборный груз в JSONL — поле ``lines`` со списком ``{"item", "quantity"}``,
+в CSV — ``item`` вида ``Товар 1=5|Товар 2=3`` (``quantity`` тогда не нужно).
+
+    python manifest_import.py arrivals.jsonl
+    python manifest_import.py gate.csv --direction unload --db crossdock.db
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+import storage
+import timeutil
+
+CHUNK_SIZE = 10000
+MAX_ERRORS = 100  # сколько ошибок с номерами строк хранит отчет
+PROGRESS_INTERVAL = 1.0
+
+DIRECTIONS = {
+    "unload": "unload", "разгрузка": "unload",
+    "load": "load", "загрузка": "load",
+}
+# Латинские буквы, которые пишут вместо кириллических в гос. номерах
+PLATE_LETTERS = str.maketrans("ABEKMHOPCTYX", "АВЕКМНОРСТУХ")
+
+csv.register_dialect("excel-semicolon", csv.excel, delimiter=";")
+
+
+class ManifestError(ValueError):
+    """Строка манифеста не прошла проверку."""
+
+
+class ImportStats:
+    """Счетчики импорта; передаются в progress после каждой пачки."""
+
+    def __init__(self, total_bytes=None):
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.bytes_read = 0
+        self.total_bytes = total_bytes
+        self.errors = []  # (номер строки, текст), не больше MAX_ERRORS
+        self.started = time.perf_counter()
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.read / elapsed if elapsed else 0.0
+
+    def format(self):
+        done = f" ({self.bytes_read / self.total_bytes:.0%})" if self.total_bytes else ""
+        return (f"строк {self.read}{done}: принято {self.imported}, отклонено {self.rejected}, "
+                f"{self.rate():.0f} строк/с")
+
+
+"""Нормализация"""
+# Регистр и латиница правятся только в самом номере; пометка в скобках,
+# как в "В009НУ 142 (разгрузка)", остается как есть.
+def normalize_plate(value):
+    plate = " ".join(str(value).split())
+    number, bracket, note = plate.partition("(")
+    return number.upper().translate(PLATE_LETTERS) + bracket + note
+
+
+def normalize_item(value):
+    item = " ".join(str(value).split())
+    return item[:1].upper() + item[1:]
+
+
+def parse_direction(value, default):
+    if value is None or value == "":
+        if default is None:
+            raise ManifestError("не указано направление (direction)")
+        return default
+    direction = DIRECTIONS.get(str(value).strip().lower())
+    if direction is None:
+        raise ManifestError(f"неизвестное направление {value!r}")
+    return direction
+
+
+def parse_arrival(value, now):
+    if value is None or value == "":
+        return now
+    if isinstance(value, bool):
+        raise ManifestError("time_arrived — не время")
+    if not isinstance(value, (int, float)):
+        value = str(value).strip()
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value).timestamp() if "-" in value[1:] else timeutil.parse_time(value, now)
+        return timeutil.check_arrival(value, now)
+    except (ValueError, OverflowError, OSError):
+        raise ManifestError(f"неверное время {value!r}") from None
+
+
+def parse_quantity(quantity):
+    try:
+        if isinstance(quantity, bool) or isinstance(quantity, float) and not quantity.is_integer():
+            raise ValueError
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ManifestError(f"неверное количество {quantity!r}") from None
+    if quantity <= 0:
+        raise ManifestError("количество должно быть положительным")
+    return quantity
+
+
+# Строки сборного груза -> (поле товара, общее количество).
+def parse_lines(lines):
+    if not isinstance(lines, list) or not lines:
+        raise ManifestError("lines — непустой список строк груза")
+    parsed = []
+    for line in lines:
+        if not isinstance(line, dict):
+            raise ManifestError("строка груза должна быть объектом")
+        item = normalize_item(line.get("item") or "")
+        if (not item or storage.LINE_SEPARATOR in item or storage.QUANTITY_SEPARATOR in item
+                or storage.has_reserved_characters(item)):
+            raise ManifestError(f"неверный товар {line.get('item')!r}")
+        parsed.append((item, parse_quantity(line.get("quantity"))))
+    return storage.format_manifest(parsed)
+
+
+# Строка манифеста -> (направление, машина в формате очередей).
+def parse_row(row, now, direction=None):
+    if not isinstance(row, dict):
+        raise ManifestError("строка должна быть объектом")
+    plate = normalize_plate(row.get("plate") or "")
+    if not plate:
+        raise ManifestError("нужен непустой plate")
+    if storage.has_reserved_characters(plate):
+        raise ManifestError("plate не может содержать ';'")
+    if row.get("lines") is not None:
+        item, quantity = parse_lines(row["lines"])
+    elif storage.is_manifest(str(row.get("item") or "")):
+        try:
+            lines = storage.parse_manifest(row["item"])
+        except ValueError as e:
+            raise ManifestError(str(e)) from None
+        item, quantity = parse_lines([{"item": name, "quantity": count} for name, count in lines])
+    else:
+        item = normalize_item(row.get("item") or "")
+        if not item:
+            raise ManifestError("нужны непустые plate и item")
+        if storage.has_reserved_characters(item):
+            raise ManifestError("item не может содержать ';'")
+        quantity = parse_quantity(row.get("quantity"))
+    return (parse_direction(row.get("direction"), direction),
+            (plate, parse_arrival(row.get("time_arrived"), now), item, quantity))
+
+
+"""Чтение"""
+# Строки двоичного файла как текст; прочитанные байты копятся в stats.bytes_read.
+def text_lines(handle, stats):
+    encoding = "utf-8-sig"  # метка BOM допустима только в начале файла
+    for raw in handle:
+        stats.bytes_read += len(raw)
+        yield raw.decode(encoding)
+        encoding = "utf-8"
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if extension in (".csv", ".txt"):
+        return "csv"
+    raise ManifestError(f"неизвестный формат манифеста {filename!r}")
+
+
+# (номер строки, словарь полей или ManifestError) для каждой непустой строки.
+def iter_rows(lines, fmt):
+    if fmt == "jsonl":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ManifestError(f"не JSON: {e}")
+        return
+
+    lines = iter(lines)
+    header = next(lines, "")
+    dialect = "excel-semicolon" if header.count(";") > header.count(",") else "excel"
+    fields = [name.strip() for name in next(csv.reader([header], dialect=dialect), [])]
+    reader = csv.reader(lines, dialect=dialect)
+    for values in reader:
+        if not values or not any(value.strip() for value in values):
+            continue
+        # Первая строка файла — заголовок, номера строк данных начинаются с 2
+        number = reader.line_num + 1
+        if len(values) != len(fields):
+            yield number, ManifestError(f"ожидалось полей {len(fields)}, получено {len(values)}")
+        else:
+            yield number, dict(zip(fields, values))
+
+
+"""Импорт"""
+def import_manifest(filename, simulation, persistence=None, direction=None, fmt=None, chunk_size=CHUNK_SIZE,
+                    progress=None, strict=False, now=None):
+    fmt = fmt or detect_format(filename)
+    now = int(timeutil.now() if now is None else now)
+    stats = ImportStats(os.path.getsize(filename))
+    queues = {"unload": simulation.unload_queue, "load": simulation.load_queue}
+    chunk = {"unload": [], "load": []}
+
+    def flush_chunk():
+        with persistence.batch() if persistence is not None else nullcontext():
+            for task_type, tasks in chunk.items():
+                queues[task_type].extend(tasks)
+                stats.imported += len(tasks)
+                tasks.clear()
+        if progress is not None:
+            progress(stats)
+
+    with open(filename, "rb") as f:
+        for number, row in iter_rows(text_lines(f, stats), fmt):
+            stats.read += 1
+            try:
+                if isinstance(row, ManifestError):
+                    raise row
+                task_type, task = parse_row(row, now, direction)
+            except ManifestError as e:
+                if strict:
+                    raise ManifestError(f"строка {number}: {e}") from None
+                stats.reject(number, str(e))
+                continue
+            chunk[task_type].append(task)
+            if stats.read % chunk_size == 0:
+                flush_chunk()
+    flush_chunk()
+    return stats
+
+
+def print_progress(file=sys.stderr, interval=PROGRESS_INTERVAL):
+    last = [0.0]
+
+    def report(stats):
+        if time.perf_counter() - last[0] >= interval:
+            last[0] = time.perf_counter()
+            print("\r" + stats.format(), end="", file=file, flush=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт манифестов прибытия в очереди")
+    parser.add_argument("manifest", help="файл JSONL или CSV")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="формат (по умолчанию по расширению)")
+    parser.add_argument("--direction", choices=("unload", "load"), help="направление для строк без direction")
+    parser.add_argument("--db", help="база SQLite вместо журнала состояния")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="машин в одной пачке")
+    parser.add_argument("--strict", action="store_true", help="остановиться на первой ошибочной строке")
+    args = parser.parse_args()
+
+    from journal import Journal
+    from simulation import CrossDockSimulation
+    from sqlite_storage import SQLiteStorage
+
+    simulation = CrossDockSimulation()
+    simulation.load_data()
+    persistence = SQLiteStorage(args.db) if args.db else Journal()
+    persistence.start(simulation)
+    try:
+        result = import_manifest(args.manifest, simulation, persistence, args.direction, args.format, args.chunk,
+                                 print_progress(), args.strict)
+    except ManifestError as e:
+        print(f"\n{e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        persistence.close()
+    print("\r" + result.format(), file=sys.stderr)
+    for number, message in result.errors:
+        print(f"строка {number}: {message}", file=sys.stderr)
@@ -0,0 +1,122 @@
+"""Замеры времени горячих путей и их экспорт.
+
+``Metrics.instrument`` подменяет методы объекта обертками, которые
+меряют каждый вызов; последние ``window`` замеров по каждому пути
+хранятся в кольцевом буфере, из которого считаются p50/p95/p99.
+Снимок отдается в текстовом формате Prometheus — в файл или по HTTP.
+"""
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "crossdock_hot_path_seconds"
+
+
+class PathStats:
+    """Кольцевой буфер длительностей одного пути и накопленные счетчики."""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, elapsed):
+        self.samples.append(elapsed)
+        self.count += 1
+        self.total += elapsed
+
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {quantile: 0.0 for quantile in quantiles}
+        return {quantile: ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] for quantile in quantiles}
+
+
+class Metrics:
+    """Реестр замеров по именам путей; безопасен для чтения из другого потока."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.paths = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def record(self, name, elapsed):
+        with self.lock:
+            stats = self.paths.get(name)
+            if stats is None:
+                stats = self.paths[name] = PathStats(self.window)
+            stats.add(elapsed)
+
+    def timed(self, name, function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+        return wrapper
+
+    # Заменяет методы obj замеряющими обертками; вызовы через self тоже замеряются.
+    def instrument(self, obj, names):
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    # [(путь, вызовов, сумма секунд, {квантиль: секунд})], отсортировано по имени.
+    def snapshot(self):
+        with self.lock:
+            return [(name, stats.count, stats.total, stats.quantiles())
+                    for name, stats in sorted(self.paths.items())]
+
+    """Экспорт"""
+    def prometheus_text(self):
+        lines = [f"# HELP {METRIC_NAME} Длительность горячих путей кросс-докинга.",
+                 f"# TYPE {METRIC_NAME} summary"]
+        for name, count, total, quantiles in self.snapshot():
+            for quantile, value in quantiles.items():
+                lines.append(f'{METRIC_NAME}{{path="{name}",quantile="{quantile}"}} {value:.9f}')
+            lines.append(f'{METRIC_NAME}_sum{{path="{name}"}} {total:.9f}')
+            lines.append(f'{METRIC_NAME}_count{{path="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    # Файл для сборщика текстовых метрик; заменяется атомарно.
+    def write_file(self, filename):
+        tmp_file = filename + ".tmp"
+        with open(tmp_file, "w", encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_file, filename)
+
+    # HTTP-эндпоинт /metrics в фоновом потоке; слушает только локальный адрес.
+    def serve(self, port, host="127.0.0.1"):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
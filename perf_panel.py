@@ -0,0 +1,45 @@
+import tkinter as tk
+from tkinter import ttk
+
+from table_view import TableView
+
+REFRESH_MS = 1000
+
+
+class PerfPanel(tk.Toplevel):
+    """Окно с p50/p95/p99 горячих путей, обновляется раз в секунду."""
+
+    def __init__(self, master, metrics, refresh_ms=REFRESH_MS):
+        super().__init__(master)
+        self.title("Производительность")
+        self.geometry("620x220")
+        self.metrics = metrics
+        self.refresh_ms = refresh_ms
+
+        columns = ("№", "Путь", "Вызовов", "p50, мс", "p95, мс", "p99, мс")
+        self.table = ttk.Treeview(self, columns=columns, show="headings")
+        for col in columns:
+            self.table.heading(col, text=col)
+            self.table.column(col, width=200 if col == "Путь" else 80)
+        self.table.pack(fill=tk.BOTH, expand=True)
+        self.view = TableView(self.table, self.rows)
+
+        self.after_id = None
+        self.refresh()
+
+    def rows(self):
+        snapshot = self.metrics.snapshot()
+        return len(snapshot), (
+            (name, (name, count, *(f"{quantiles[q] * 1000:.2f}" for q in sorted(quantiles))))
+            for name, count, _, quantiles in snapshot
+        )
+
+    def refresh(self):
+        self.view.refresh()
+        self.after_id = self.after(self.refresh_ms, self.refresh)
+
+    def destroy(self):
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+        super().destroy()
@@ -0,0 +1,123 @@
+import storage
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него ранжирование идет через DispatchQueue.ordered
+    np = None
+
+CAPACITY = 1024
+
+
+class QueueColumns:
+    """Колоночное зеркало DispatchQueue для ранжирования всей очереди в NumPy.
+
+    Время прибытия, номер товара, количество и seq каждой машины лежат в
+    отдельных массивах; зеркало подписано на наблюдателей очереди и
+    обновляется вместе с ней. Удаленные записи помечаются в маске
+    ``alive`` и вычищаются, когда их становится больше половины.
+
+    Приоритет считается так же, как в ``calculate_priority``:
+    ``waiting_weight * (now - прибытие) + item_score(товар)``, где оценка
+    товара вычисляется один раз на товар, а не на машину.
+    """
+
+    def __init__(self, queue, capacity=CAPACITY):
+        if np is None:
+            raise ImportError("для QueueColumns нужен numpy")
+        self.queue = queue
+        self.item_ids = {}  # товар или набор товаров (storage.item_key) -> номер
+        self.items = []
+
+        self.arrival = np.empty(capacity, dtype=np.float64)
+        self.item = np.empty(capacity, dtype=np.int32)
+        self.quantity = np.empty(capacity, dtype=np.int64)
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.size = 0  # занятые строки, включая удаленные
+        self.dead = 0
+        self.slots = {}  # seq -> строка
+
+        for seq, task in queue.items():
+            self.append(seq, task)
+        queue.observers.append(self.on_queue)
+
+    def __len__(self):
+        return self.size - self.dead
+
+    def on_queue(self, event, seq, task):
+        if event == "push":
+            self.append(seq, task)
+        elif event == "remove":
+            self.kill(seq)
+        elif event == "clear":
+            self.size = 0
+            self.dead = 0
+            self.slots = {}
+
+    def item_id(self, item):
+        item = storage.item_key(item)
+        item_id = self.item_ids.get(item)
+        if item_id is None:
+            item_id = self.item_ids[item] = len(self.items)
+            self.items.append(item)
+        return item_id
+
+    def append(self, seq, task):
+        if self.size == len(self.arrival):
+            self.grow(2 * len(self.arrival))
+        slot = self.size
+        _, arrival, item, quantity = task
+        self.arrival[slot] = arrival
+        self.item[slot] = self.item_id(item)
+        self.quantity[slot] = quantity
+        self.seq[slot] = seq
+        self.alive[slot] = True
+        self.slots[seq] = slot
+        self.size += 1
+
+    def grow(self, capacity):
+        for name in ("arrival", "item", "quantity", "seq", "alive"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def kill(self, seq):
+        slot = self.slots.pop(seq)
+        self.alive[slot] = False
+        self.dead += 1
+        if self.dead > CAPACITY and self.dead * 2 > self.size:
+            self.compact()
+
+    def compact(self):
+        keep = self.alive[:self.size]
+        count = int(keep.sum())
+        for name in ("arrival", "item", "quantity", "seq", "alive"):
+            column = getattr(self, name)
+            column[:count] = column[:self.size][keep]
+        self.size = count
+        self.dead = 0
+        self.slots = dict(zip(self.seq[:count].tolist(), range(count)))
+
+    """Ранжирование"""
+    # Приоритеты всех строк; у удаленных -inf.
+    def scores(self, now):
+        size = self.size
+        item_scores = np.array([self.queue.item_score(item) for item in self.items], dtype=np.float64)
+        scores = self.queue.waiting_weight * (now - self.arrival[:size])
+        if len(item_scores):
+            scores += item_scores[self.item[:size]]
+        scores[~self.alive[:size]] = -np.inf
+        return scores
+
+    # k лучших машин по убыванию приоритета; при равенстве раньше та, что раньше встала в очередь.
+    def top_k(self, k, now):
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        scores = self.scores(now)
+        threshold = np.partition(scores, self.size - k)[self.size - k]
+        candidates = np.flatnonzero(scores >= threshold)
+        order = candidates[np.lexsort((self.seq[candidates], -scores[candidates]))][:k]
+        entries = self.queue.entries
+        return [entries[seq][1] for seq in self.seq[order].tolist()]
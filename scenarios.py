@@ -0,0 +1,228 @@
+"""Пакетный прогон сценариев кросс-докинга методом Монте-Карло.
+
+Для каждой комбинации параметров (число постов, масштаб норм времени,
+поток машин) выполняется ``replications`` независимых прогонов
+симуляции на пуле процессов. Результаты сводятся в одну таблицу:
+пропускная способность, время пребывания машины на терминале, время
+до последней операции, пиковый запас склада и время хранения товара.
+
+    python scenarios.py --unload-doors 1 2 3 --load-doors 1 2 --replications 50
+    python scenarios.py --policy greedy lookahead --trucks 300 --interarrival 30
+
+Прогон с номером r во всех сценариях использует одно и то же зерно,
+поэтому сценарии сравниваются на одинаковых потоках машин — в том числе
+жадная политика и планировщик с упреждением (``--policy``).
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import storage
+from handling_rates import HandlingRates
+from lookahead import LookaheadPolicy
+from simulation import UNLOAD_ACTION, CrossDockSimulation
+from workload import generate_arrivals
+
+START_TIME = 0
+
+POLICIES = {
+    "greedy": lambda: None,
+    "lookahead": LookaheadPolicy,
+}
+
+COLUMNS = [
+    "policy", "unload_doors", "load_doors", "unload_scale", "load_scale", "trucks", "interarrival", "load_share",
+    "replications", "served", "throughput", "throughput_std", "dwell", "dwell_p95", "makespan", "peak_stock",
+    "holding",
+]
+
+
+class Scenario:
+    """Набор параметров одного сценария."""
+
+    def __init__(self, unload_doors=1, load_doors=1, unload_scale=1.0, load_scale=1.0,
+                 trucks=200, interarrival=60.0, load_share=0.5, policy="greedy"):
+        self.unload_doors = unload_doors
+        self.load_doors = load_doors
+        self.unload_scale = unload_scale
+        self.load_scale = load_scale
+        self.trucks = trucks
+        self.interarrival = interarrival
+        self.load_share = load_share
+        self.policy = policy
+
+    def params(self):
+        return {
+            "unload_doors": self.unload_doors,
+            "load_doors": self.load_doors,
+            "unload_scale": self.unload_scale,
+            "load_scale": self.load_scale,
+            "trucks": self.trucks,
+            "interarrival": self.interarrival,
+            "load_share": self.load_share,
+            "policy": self.policy,
+        }
+
+
+def scenario_grid(unload_doors, load_doors, unload_scales, load_scales, trucks, interarrivals, load_shares,
+                  policies=("greedy",)):
+    return [
+        Scenario(*values)
+        for values in itertools.product(unload_doors, load_doors, unload_scales, load_scales,
+                                        trucks, interarrivals, load_shares, policies)
+    ]
+
+
+def scale_times(times, scale):
+    return HandlingRates((item, max(1, round(int(seconds) * scale))) for item, seconds in times)
+
+
+# Один прогон; выполняется в отдельном процессе.
+def run_replication(scenario, unload_times, load_times, warehouse, seed):
+    rng = random.Random(seed)
+    simulation = CrossDockSimulation(now=START_TIME, unload_doors=scenario.unload_doors,
+                                     load_doors=scenario.load_doors)
+    simulation.unload_times = scale_times(unload_times, scenario.unload_scale)
+    simulation.load_times = scale_times(load_times, scenario.load_scale)
+    simulation.warehouse = dict(warehouse)
+    simulation.policy = POLICIES[scenario.policy]()
+
+    items = sorted(set(simulation.unload_times.rates) | set(simulation.load_times.rates))
+    remaining = {}  # (тип, машина, прибытие) -> еще не обработанное количество
+    for time, task_type, car_data in generate_arrivals(rng, scenario.trucks, scenario.interarrival,
+                                                       scenario.load_share, items, start=START_TIME):
+        remaining[(task_type, car_data[0], car_data[1])] = car_data[3]
+        simulation.schedule_arrival(time, task_type, car_data)
+
+    dwell = []
+    last_end = [START_TIME]
+
+    def on_operation(action, data, start_time, end_time, door=None):
+        plate, time_arrived, _, quantity = data
+        key = ("unload" if action == UNLOAD_ACTION else "load", plate, time_arrived)
+        # Частичная загрузка: машина уезжает после последней партии
+        remaining[key] -= quantity
+        if remaining[key] <= 0:
+            dwell.append(end_time - time_arrived)
+        last_end[0] = max(last_end[0], end_time)
+
+    stock = [sum(quantity for _, quantity in simulation.warehouse.values())]
+    peak = [stock[0]]
+    holding = [0.0]  # единицы товара на складе * секунды
+    last_change = [START_TIME]
+
+    def on_stock(item, delta, time):
+        holding[0] += stock[0] * (simulation.now - last_change[0])
+        last_change[0] = simulation.now
+        stock[0] += delta
+        peak[0] = max(peak[0], stock[0])
+
+    simulation.operation_listeners.append(on_operation)
+    simulation.stock_listeners.append(on_stock)
+    simulation.run()
+
+    hours = (last_end[0] - START_TIME) / 3600
+    return {
+        "served": len(dwell),
+        "throughput": len(dwell) / hours if hours else 0.0,
+        "dwell": dwell,
+        "makespan": last_end[0] - START_TIME,
+        "peak_stock": peak[0],
+        "holding": holding[0] + stock[0] * (last_end[0] - last_change[0]),
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(scenario, results):
+    throughput = [result["throughput"] for result in results]
+    dwell = [value for result in results for value in result["dwell"]]
+    row = scenario.params()
+    row.update({
+        "replications": len(results),
+        "served": statistics.mean(result["served"] for result in results),
+        "throughput": statistics.mean(throughput),
+        "throughput_std": statistics.stdev(throughput) if len(throughput) > 1 else 0.0,
+        "dwell": statistics.mean(dwell) if dwell else 0.0,
+        "dwell_p95": percentile(dwell, 0.95),
+        "makespan": statistics.mean(result["makespan"] for result in results),
+        "peak_stock": statistics.mean(result["peak_stock"] for result in results),
+        "holding": statistics.mean(result["holding"] for result in results),
+    })
+    return row
+
+
+def run_scenarios(scenarios, replications, seed=0, workers=None, unload_times_file=storage.UNLOAD_TIMES_FILE,
+                  load_times_file=storage.LOAD_TIMES_FILE, warehouse_file=storage.WAREHOUSE_FILE):
+    unload_times = storage.read_times_from_file(unload_times_file)
+    load_times = storage.read_times_from_file(load_times_file)
+    warehouse = storage.read_warehouse_from_file(warehouse_file, START_TIME)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [
+            [pool.submit(run_replication, scenario, unload_times, load_times, warehouse, seed + replication)
+             for replication in range(replications)]
+            for scenario in scenarios
+        ]
+        return [summarize(scenario, [future.result() for future in runs])
+                for scenario, runs in zip(scenarios, futures)]
+
+
+def format_value(value):
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+
+def print_table(rows, file=sys.stdout):
+    table = [COLUMNS] + [[format_value(row[column]) for column in COLUMNS] for row in rows]
+    widths = [max(len(line[index]) for line in table) for index in range(len(COLUMNS))]
+    for line in table:
+        print("  ".join(value.rjust(width) for value, width in zip(line, widths)), file=file)
+
+
+def write_csv(rows, filename):
+    with open(filename, "w", encoding='utf-8', newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Прогон сценариев кросс-докинга методом Монте-Карло")
+    parser.add_argument("--unload-doors", type=int, nargs="+", default=[1], help="числа постов разгрузки")
+    parser.add_argument("--load-doors", type=int, nargs="+", default=[1], help="числа постов загрузки")
+    parser.add_argument("--unload-scale", type=float, nargs="+", default=[1.0],
+                        help="множители норм из unload_times.txt")
+    parser.add_argument("--load-scale", type=float, nargs="+", default=[1.0],
+                        help="множители норм из load_times.txt")
+    parser.add_argument("--trucks", type=int, nargs="+", default=[200], help="машин за прогон")
+    parser.add_argument("--interarrival", type=float, nargs="+", default=[60.0],
+                        help="средний интервал между машинами, с")
+    parser.add_argument("--load-share", type=float, nargs="+", default=[0.5], help="доля машин на загрузку")
+    parser.add_argument("--policy", nargs="+", choices=sorted(POLICIES), default=["greedy"],
+                        help="политики выбора машин")
+    parser.add_argument("--replications", type=int, default=20, help="прогонов на сценарий")
+    parser.add_argument("--seed", type=int, default=0, help="начальное зерно")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--csv", help="сохранить таблицу результатов в CSV")
+    args = parser.parse_args(argv)
+
+    scenarios = scenario_grid(args.unload_doors, args.load_doors, args.unload_scale, args.load_scale,
+                              args.trucks, args.interarrival, args.load_share, args.policy)
+    rows = run_scenarios(scenarios, args.replications, args.seed, args.workers)
+    print_table(rows)
+    if args.csv:
+        write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+import heapq
+import sys
+
+import storage
+import timeutil
+from dispatch_queue import DispatchQueue
+from handling_rates import HandlingRates
+from item_index import ItemIndex
+
+WEIGHTS = {
+    "waiting_time": 2.0,  # Срочность
+    "dependency": 3.0,   # Зависимость
+    "availability": 1.0,  # Доступность
+}
+
+UNLOAD_ACTION = "Завершена разгрузка"
+LOAD_ACTION = "Завершена загрузка"
+
+# Типы событий в куче
+ARRIVAL_EVENT = "arrival"
+UNLOAD_DONE_EVENT = "unload_done"
+LOAD_DONE_EVENT = "load_done"
+
+
+class Door:
+    """Пост (ворота) разгрузки или загрузки со своей текущей работой."""
+
+    def __init__(self, task_type, number):
+        self.task_type = task_type
+        self.number = number
+        self.name = f"Пост {'разгрузки' if task_type == 'unload' else 'загрузки'} {number}"
+
+        self.job = None
+        self.start_time = None
+        self.end_time = None
+        self.partial = False
+
+    def is_free(self):
+        return self.job is None
+
+
+class CrossDockSimulation:
+    """Ядро кросс-докинга без графического интерфейса.
+
+    Часы виртуальные: ``run`` перескакивает сразу к ближайшему событию
+    (прибытие машины, завершение разгрузки или загрузки), поэтому смена
+    моделируется за доли секунды. Окно приложения двигает те же часы по
+    реальному времени через ``advance_to``.
+
+    Постов разгрузки и загрузки может быть несколько; свободный пост с
+    наименьшим номером получает лучшую по приоритету машину.
+
+    Все моменты времени (прибытие, начало и конец работ, события) —
+    секунды эпохи Unix; в строки они превращаются только в файлах и окне.
+
+    Машина со сборным грузом — одна запись очереди, в поле товара которой
+    лежит перечень строк (``storage.item_lines``). Она встает на пост
+    один раз, время работы складывается из норм всех ее товаров, а склад
+    меняется по всем строкам сразу при завершении работы.
+    """
+
+    def __init__(self, now=None, unload_doors=1, load_doors=1):
+        self.unload_queue = DispatchQueue(lambda item: self.item_score(item, "unload"), WEIGHTS["waiting_time"])
+        self.load_queue = DispatchQueue(lambda item: self.item_score(item, "load"), WEIGHTS["waiting_time"])
+        self.warehouse = {}
+        # Первая машина загрузки с каждым товаром, обновляется вместе с очередью
+        self.item_index = ItemIndex(self.load_queue)
+        # Колоночные копии очередей для ранжирования в NumPy, создаются по первому запросу
+        self.columns = {}
+
+        # Нормы времени: секунд на единицу товара
+        self.unload_times = HandlingRates()
+        self.load_times = HandlingRates()
+
+        self.unload_doors = [Door("unload", number) for number in range(1, unload_doors + 1)]
+        self.load_doors = [Door("load", number) for number in range(1, load_doors + 1)]
+        # Товар, уже обещанный машинам на постах загрузки
+        self.reserved = {}
+
+        # Погрузка ждет поступления товара
+        self.load_waiting = False
+        # Планировщик с упреждением (lookahead.LookaheadPolicy); None — жадный выбор по приоритету
+        self.policy = None
+
+        self.now = now if now is not None else timeutil.now()
+        self.events = []
+        self.event_counter = 0
+
+        # Подписчики на завершенные операции: f(action, data, start_time, end_time, door)
+        self.operation_listeners = []
+        # Подписчики на начало работы поста: f(task_type, job)
+        self.dispatch_listeners = []
+        # Подписчики на изменения склада: f(item, delta, time)
+        self.stock_listeners = []
+
+    """Работа с файлами"""
+    def load_data(self, unload_file=storage.UNLOAD_FILE, load_file=storage.LOAD_FILE,
+                  warehouse_file=storage.WAREHOUSE_FILE, unload_times_file=storage.UNLOAD_TIMES_FILE,
+                  load_times_file=storage.LOAD_TIMES_FILE):
+        # Время в файлах без даты относится к последним суткам до текущего момента
+        self.unload_queue.clear()
+        self.unload_queue.extend(storage.read_queue_from_file(unload_file, self.now))
+        self.load_queue.clear()
+        self.load_queue.extend(storage.read_queue_from_file(load_file, self.now))
+        self.warehouse = storage.read_warehouse_from_file(warehouse_file, self.now)
+        self.unload_times = HandlingRates(storage.read_times_from_file(unload_times_file))
+        self.load_times = HandlingRates(storage.read_times_from_file(load_times_file))
+
+    def save_data(self, unload_file=storage.UNLOAD_FILE, load_file=storage.LOAD_FILE,
+                  warehouse_file=storage.WAREHOUSE_FILE, unload_times_file=storage.UNLOAD_TIMES_FILE,
+                  load_times_file=storage.LOAD_TIMES_FILE):
+        storage.write_queue_to_file(unload_file, self.unload_queue)
+        storage.write_queue_to_file(load_file, self.load_queue)
+        storage.write_warehouse_to_file(warehouse_file, self.warehouse)
+
+        storage.save_times_to_file(unload_times_file, self.unload_times)
+        storage.save_times_to_file(load_times_file, self.load_times)
+
+    """Очереди"""
+    def add_to_unload(self, car_data):
+        self.unload_queue.push(car_data)
+
+    def add_to_load(self, car_data):
+        self.load_queue.push(car_data)
+
+    def schedule_arrival(self, time, task_type, car_data):
+        self.push_event(time, ARRIVAL_EVENT, (task_type, car_data))
+
+    """Оценка приоритетов с учетом взвешенных факторов"""
+    def calculate_priority(self, task, task_type):
+        _, time_arrived, item, _ = task
+        waiting_time = self.now - time_arrived
+        waiting_score = waiting_time * WEIGHTS["waiting_time"]
+        return waiting_score + self.item_score(item, task_type)
+
+    # Часть приоритета, зависящая только от товара (одинакова для всех машин с ним);
+    # item — поле товара машины или ключ корзины storage.item_key.
+    def item_score(self, item, task_type):
+        if task_type == "unload":
+            return self.is_item_needed_for_load(item) * WEIGHTS["dependency"]
+        elif task_type == "load":
+            return self.is_item_available_in_warehouse(item) * WEIGHTS["availability"]
+        return 0
+
+    # k лучших машин очереди по текущему приоритету; с NumPy — одним проходом по колонкам.
+    def top_candidates(self, task_type, k):
+        queue = self.unload_queue if task_type == "unload" else self.load_queue
+        # queue_columns загружает NumPy, поэтому импортируется при первом ранжировании, а не при запуске
+        from queue_columns import QueueColumns, np
+        if np is None:
+            return queue.ordered()[:k]
+        columns = self.columns.get(task_type)
+        if columns is None:
+            columns = self.columns[task_type] = QueueColumns(queue)
+        return columns.top_k(k, self.now)
+
+    # Проверяет, нужен ли товар для задач на загрузку, и возвращает его индекс в очереди загрузки.
+    # Для сборного груза — самый срочный из его товаров.
+    def is_item_needed_for_load(self, item):
+        if isinstance(item, str) and not storage.is_manifest(item):
+            return self.item_index.needed_for_load(item)
+        return max(self.item_index.needed_for_load(name) for name in storage.item_names(item))
+
+    # Возвращает True, если товар есть на складе в достаточном количестве;
+    # для сборного груза — если на складе есть все его товары.
+    def is_item_available_in_warehouse(self, item):
+        warehouse = self.warehouse
+        if isinstance(item, str) and not storage.is_manifest(item):
+            return item in warehouse and warehouse[item][1] > 0
+        return all(name in warehouse and warehouse[name][1] > 0 for name in storage.item_names(item))
+
+    """Посты"""
+    def free_door(self, doors):
+        for door in doors:
+            if door.is_free():
+                return door
+        return None
+
+    def active_jobs(self, task_type):
+        doors = self.unload_doors if task_type == "unload" else self.load_doors
+        return [door.job for door in doors if not door.is_free()]
+
+    # Машина еще не обслужена целиком: ждет в очереди или стоит на посту (остаток частичной загрузки).
+    def is_pending(self, task_type, plate, time_arrived):
+        queue = self.unload_queue if task_type == "unload" else self.load_queue
+        if queue.contains(plate, time_arrived):
+            return True
+        return any(job[0] == plate and job[1] == time_arrived for job in self.active_jobs(task_type))
+
+    def assign(self, door, job, duration, event):
+        end = self.now + duration
+        door.job = job
+        door.start_time = self.now
+        door.end_time = end
+        self.push_event(end, event, door)
+        self.notify_dispatch(door.task_type, job)
+
+    def release(self, door, action):
+        job = door.job
+        door.job = None
+        door.partial = False
+        self.notify(action, job, door.start_time, door.end_time, door.name)
+
+    """Разгрузка с улучшенным приоритетом"""
+    def start_unload(self):
+        door = self.free_door(self.unload_doors)
+        if door is None or not self.unload_queue:
+            return False
+
+        if self.policy is None:
+            job = self.unload_queue.pop()
+        else:
+            job = self.policy.choose(self, "unload")
+            self.unload_queue.discard(job)
+        self.assign(door, job, self.calculate_unload_time(job), UNLOAD_DONE_EVENT)
+        return True
+
+    def calculate_unload_time(self, job):
+        return self.unload_times.duration(job)
+
+    def complete_unload(self, door):
+        _, _, item, quantity = door.job
+        for name, count in storage.item_lines(item, quantity):
+            self.change_stock(name, count, int(self.now))
+        self.release(door, UNLOAD_ACTION)
+
+    """Загрузка с улучшенным приоритетом"""
+    def start_load(self):
+        door = self.free_door(self.load_doors)
+        if door is None or not self.load_queue:
+            return False
+
+        # Лучшая машина остается в очереди, пока ее товара нет на складе;
+        # планировщик выбирает только среди машин, чей товар уже есть
+        job = self.load_queue.peek() if self.policy is None else self.policy.choose(self, "load")
+        if job is None:
+            self.load_waiting = True
+            return False
+
+        plate, time_arrived, item, quantity = job
+        # Строки, которые есть на складе, грузятся сейчас; остальное остается
+        # в очереди отдельной записью той же машины
+        taken, remainder = [], []
+        for name, count in storage.item_lines(item, quantity):
+            ready = max(0, min(count, self.available_quantity(name)))
+            if ready:
+                taken.append((name, ready))
+            if ready < count:
+                remainder.append((name, count - ready))
+        if not taken:
+            self.load_waiting = True
+            return False
+
+        if self.policy is None:
+            self.load_queue.pop()
+        else:
+            self.load_queue.discard(job)
+        self.load_waiting = False
+        door.partial = bool(remainder)
+        if door.partial:
+            job = (plate, time_arrived, *storage.format_manifest(taken))
+            self.load_queue.push((plate, time_arrived, *storage.format_manifest(remainder)))
+
+        for name, count in taken:
+            self.reserved[name] = self.reserved.get(name, 0) + count
+        self.assign(door, job, self.calculate_load_time(job), LOAD_DONE_EVENT)
+        return True
+
+    # Остаток на складе за вычетом того, что уже грузится на других постах.
+    def available_quantity(self, item):
+        if item not in self.warehouse:
+            return 0
+        return self.warehouse[item][1] - self.reserved.get(item, 0)
+
+    def calculate_load_time(self, job):
+        return self.load_times.duration(job)
+
+    # Длительности работ для списка машин (по умолчанию — всей очереди) одним вызовом.
+    def handling_durations(self, task_type, tasks=None):
+        if task_type == "unload":
+            rates, queue = self.unload_times, self.unload_queue
+        else:
+            rates, queue = self.load_times, self.load_queue
+        return rates.durations(queue if tasks is None else tasks)
+
+    def complete_load(self, door):
+        _, _, item, quantity = door.job
+        for name, count in storage.item_lines(item, quantity):
+            self.reserved[name] -= count
+            if not self.reserved[name]:
+                del self.reserved[name]
+            if name in self.warehouse and self.warehouse[name][1] >= count:
+                self.change_stock(name, -count)
+        self.release(door, LOAD_ACTION)
+
+    """Работа со складом"""
+    # Меняет остаток товара; time задается при поступлении и сохраняется при отгрузке.
+    def change_stock(self, item, delta, time=None):
+        prev_time, quantity = self.warehouse.get(item, (time, 0))
+        quantity += delta
+        if delta < 0 and quantity == 0:
+            del self.warehouse[item]
+        else:
+            self.warehouse[item] = (time or prev_time, quantity)
+
+        for listener in self.stock_listeners:
+            listener(item, delta, time)
+
+    def notify(self, action, data, start_time, end_time, door=None):
+        for listener in self.operation_listeners:
+            listener(action, data, start_time, end_time, door)
+
+    def notify_dispatch(self, task_type, job):
+        for listener in self.dispatch_listeners:
+            listener(task_type, job)
+
+    """Очередь событий и виртуальные часы"""
+    def push_event(self, time, kind, payload=None):
+        # Счетчик разрывает ничьи по времени и сохраняет порядок постановки
+        self.event_counter += 1
+        heapq.heappush(self.events, (time, self.event_counter, kind, payload))
+
+    def next_event_time(self):
+        return self.events[0][0] if self.events else None
+
+    # Распределяет машины из очередей по всем свободным постам.
+    def dispatch(self):
+        started = False
+        while self.start_unload():
+            started = True
+        while self.start_load():
+            started = True
+        return started
+
+    # Обрабатывает одно ближайшее событие и сдвигает часы на его время.
+    def step(self):
+        time, _, kind, payload = heapq.heappop(self.events)
+        self.now = max(self.now, time)
+
+        if kind == ARRIVAL_EVENT:
+            task_type, car_data = payload
+            if task_type == "unload":
+                self.add_to_unload(car_data)
+            else:
+                self.add_to_load(car_data)
+        elif kind == UNLOAD_DONE_EVENT:
+            self.complete_unload(payload)
+        elif kind == LOAD_DONE_EVENT:
+            self.complete_load(payload)
+
+        self.dispatch()
+        return kind
+
+    # Обрабатывает все события до момента now (режим реального времени).
+    def advance_to(self, now):
+        processed = 0
+        while self.events and self.events[0][0] <= now:
+            self.step()
+            processed += 1
+        self.now = max(self.now, now)
+        return processed
+
+    # Прогоняет модель до момента until или до опустошения очереди событий.
+    def run(self, until=None):
+        self.dispatch()
+        processed = 0
+        while self.events and (until is None or self.events[0][0] <= until):
+            self.step()
+            processed += 1
+        if until is not None:
+            self.now = max(self.now, until)
+        return processed
+
+
+if __name__ == "__main__":
+    # Безоконный прогон текущих очередей до конца; история печатается в stdout.
+    simulation = CrossDockSimulation()
+    simulation.load_data()
+    simulation.operation_listeners.append(
+        lambda *record: sys.stdout.write(storage.format_history_record(*record)))
+    events = simulation.run()
+    print(f"Событий: {events}; осталось на разгрузку: {len(simulation.unload_queue)}, "
+          f"на загрузку: {len(simulation.load_queue)}", file=sys.stderr)
@@ -0,0 +1,378 @@
+import json
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import storage
+from handling_rates import HandlingRates
+from simulation import UNLOAD_ACTION
+from timeutil import ClockSequence, now, parse_time
+
+DATABASE_FILE = "crossdock.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    direction TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    time_arrived INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_direction ON queue (direction, id);
+CREATE INDEX IF NOT EXISTS queue_plate ON queue (plate);
+CREATE INDEX IF NOT EXISTS queue_item ON queue (item);
+
+CREATE TABLE IF NOT EXISTS active_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    direction TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    time_arrived INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS warehouse (
+    item TEXT PRIMARY KEY,
+    time INTEGER NOT NULL,
+    quantity INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS handling_times (
+    direction TEXT NOT NULL,
+    item TEXT NOT NULL,
+    seconds INTEGER NOT NULL,
+    PRIMARY KEY (direction, item)
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    time_arrived INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    door TEXT,
+    start_ts INTEGER,
+    end_ts INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+HISTORY_INDEXES = """
+CREATE INDEX IF NOT EXISTS history_start_ts ON history (start_ts);
+CREATE INDEX IF NOT EXISTS history_end_ts ON history (end_ts);
+CREATE INDEX IF NOT EXISTS history_plate_ts ON history (plate, start_ts);
+CREATE INDEX IF NOT EXISTS history_item_ts ON history (item, start_ts);
+"""
+
+HISTORY_COLUMNS = "action, plate, time_arrived, item, quantity, start_ts, end_ts, door"
+
+COMMIT_EVERY = 500
+
+
+# Строка истории в формате storage.parse_history_record (время — секунды эпохи).
+def history_record(row):
+    action, plate, time_arrived, item, quantity, start, end, door = row
+    return action, plate, parse_time(time_arrived, start), item, quantity, start, end, door
+
+
+class SQLiteStorage:
+    """Хранение очередей, склада, норм времени и истории во встроенной SQLite.
+
+    Альтернатива текстовым файлам и журналу: подключается к тем же
+    событиям симуляции и меняет только затронутые строки. Изменения
+    фиксируются пачками — при ``flush`` или каждые ``commit_every``
+    изменений. При первом запуске база заполняется из текстовых файлов.
+
+    Время хранится секундами эпохи; у истории это колонки ``start_ts`` и
+    ``end_ts`` с индексами, а ``start_time``/``end_time`` остаются
+    показаниями часов для чтения человеком. Запросы истории по окну
+    (``records_between``, ``time_range``) те же, что у
+    ``history_archive.HistoryArchive``, поэтому с базой диаграмма и
+    показатели читают историю из нее. Снимок показателей хранится в
+    ``meta`` вместе с id последней учтенной строки истории, так что при
+    запуске доигрываются только строки после него.
+    """
+
+    def __init__(self, database_file=DATABASE_FILE, commit_every=COMMIT_EVERY):
+        self.database_file = database_file
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(database_file)
+        self.connection.executescript(SCHEMA)
+        self.upgrade_schema()
+
+        self.simulation = None
+        self.row_ids = {"unload": {}, "load": {}}  # seq в очереди -> id строки
+        self.job_ids = {"unload": [], "load": []}  # (машина, id строки) начатых работ
+        self.changes = 0
+        self.batching = 0
+        self.max_duration = None  # самая долгая операция истории, читается при первом запросе
+
+    # Базы, созданные до появления нескольких постов, получают колонку door,
+    # а до перехода на секунды эпохи — колонки start_ts/end_ts, заполненные
+    # по строкам "%H:%M:%S" с переходом через полночь.
+    def upgrade_schema(self):
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(history)")]
+        with self.connection:
+            if "door" not in columns:
+                self.connection.execute("ALTER TABLE history ADD COLUMN door TEXT")
+            if "start_ts" not in columns:
+                self.connection.execute("ALTER TABLE history ADD COLUMN start_ts INTEGER")
+                self.connection.execute("ALTER TABLE history ADD COLUMN end_ts INTEGER")
+                self.connection.executescript(
+                    "DROP INDEX IF EXISTS history_start; DROP INDEX IF EXISTS history_plate; "
+                    "DROP INDEX IF EXISTS history_item;")
+                rows = self.connection.execute(
+                    "SELECT id, action, plate, time_arrived, item, quantity, start_time, end_time "
+                    "FROM history ORDER BY id").fetchall()
+                sequence = ClockSequence(now())
+                parsed = []
+                for row_id, *parts in rows:
+                    record = storage.parse_history_record(tuple(map(str, parts)), sequence)
+                    if record is not None:
+                        parsed.append((row_id, record))
+                records = storage.shift_into_past([record for _, record in parsed])
+                updates = [(record[2], record[5], record[6], row_id)
+                           for (row_id, _), record in zip(parsed, records)]
+                self.connection.executemany(
+                    "UPDATE history SET time_arrived = ?, start_ts = ?, end_ts = ? WHERE id = ?", updates)
+        self.connection.executescript(HISTORY_INDEXES)
+
+    """Импорт из текстовых файлов"""
+    def is_initialized(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'imported'").fetchone()
+        return row is not None
+
+    def import_text_files(self, unload_file=storage.UNLOAD_FILE, load_file=storage.LOAD_FILE,
+                          warehouse_file=storage.WAREHOUSE_FILE, unload_times_file=storage.UNLOAD_TIMES_FILE,
+                          load_times_file=storage.LOAD_TIMES_FILE, history_file=storage.HISTORY_FILE):
+        with self.connection:
+            for direction, filename in (("unload", unload_file), ("load", load_file)):
+                self.connection.execute("DELETE FROM queue WHERE direction = ?", (direction,))
+                self.connection.executemany(
+                    "INSERT INTO queue (direction, plate, time_arrived, item, quantity) VALUES (?, ?, ?, ?, ?)",
+                    ((direction, *task) for task in storage.read_queue_from_file(filename)))
+
+            self.connection.execute("DELETE FROM warehouse")
+            self.connection.executemany(
+                "INSERT INTO warehouse (item, time, quantity) VALUES (?, ?, ?)",
+                ((item, time, quantity)
+                 for item, (time, quantity) in storage.read_warehouse_from_file(warehouse_file).items()))
+
+            for direction, filename in (("unload", unload_times_file), ("load", load_times_file)):
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO handling_times (direction, item, seconds) VALUES (?, ?, ?)",
+                    ((direction, item, int(seconds)) for item, seconds in storage.read_times_from_file(filename)))
+
+            try:
+                history = storage.read_history_records(history_file)
+            except FileNotFoundError:
+                history = []
+            self.connection.executemany(
+                "INSERT INTO history (action, plate, time_arrived, item, quantity, start_time, end_time, door, "
+                "start_ts, end_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.history_row(*record) for record in history))
+
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported', '1')")
+        self.max_duration = None
+
+    """Загрузка и сохранение"""
+    def start(self, simulation):
+        if not self.is_initialized():
+            self.import_text_files()
+        self.load(simulation)
+        self.attach(simulation)
+
+    def load(self, simulation):
+        for direction, queue in (("unload", simulation.unload_queue), ("load", simulation.load_queue)):
+            queue.clear()
+            self.row_ids[direction] = {}
+            # Незавершенные до перезапуска работы возвращаются в очередь
+            rows = self.connection.execute(
+                "SELECT id, plate, time_arrived, item, quantity FROM queue WHERE direction = ? "
+                "UNION ALL SELECT NULL, plate, time_arrived, item, quantity FROM active_jobs WHERE direction = ?",
+                (direction, direction)).fetchall()
+            for row_id, *task in rows:
+                task = storage.parse_task(task, simulation.now)
+                queue.push(task)
+                if row_id is None:
+                    row_id = self.insert_queue_row(direction, task)
+                self.row_ids[direction][queue.counter] = row_id
+        with self.connection:
+            self.connection.execute("DELETE FROM active_jobs")
+
+        simulation.warehouse = {
+            item: (parse_time(time, simulation.now), quantity)
+            for item, time, quantity in self.connection.execute("SELECT item, time, quantity FROM warehouse")
+        }
+        simulation.unload_times = self.read_times("unload")
+        simulation.load_times = self.read_times("load")
+
+    def read_times(self, direction):
+        rows = self.connection.execute(
+            "SELECT item, seconds FROM handling_times WHERE direction = ? ORDER BY item", (direction,))
+        return HandlingRates((item, str(seconds)) for item, seconds in rows)
+
+    def attach(self, simulation):
+        self.simulation = simulation
+        simulation.unload_queue.observers.append(lambda event, seq, task: self.on_queue(event, "unload", seq, task))
+        simulation.load_queue.observers.append(lambda event, seq, task: self.on_queue(event, "load", seq, task))
+        simulation.dispatch_listeners.append(self.on_dispatch)
+        simulation.stock_listeners.append(self.on_stock)
+        simulation.operation_listeners.append(self.on_operation)
+
+    def insert_queue_row(self, direction, task):
+        cursor = self.connection.execute(
+            "INSERT INTO queue (direction, plate, time_arrived, item, quantity) VALUES (?, ?, ?, ?, ?)",
+            (direction, *task))
+        return cursor.lastrowid
+
+    def on_queue(self, event, direction, seq, task):
+        if event == "push":
+            self.row_ids[direction][seq] = self.insert_queue_row(direction, task)
+        elif event == "remove":
+            self.connection.execute("DELETE FROM queue WHERE id = ?", (self.row_ids[direction].pop(seq),))
+        elif event == "clear":
+            self.connection.execute("DELETE FROM queue WHERE direction = ?", (direction,))
+            self.row_ids[direction] = {}
+        self.changed()
+
+    def on_dispatch(self, direction, job):
+        cursor = self.connection.execute(
+            "INSERT INTO active_jobs (direction, plate, time_arrived, item, quantity) VALUES (?, ?, ?, ?, ?)",
+            (direction, *job))
+        self.job_ids[direction].append((job, cursor.lastrowid))
+        self.changed()
+
+    def on_stock(self, item, delta, time):
+        if item in self.simulation.warehouse:
+            time, quantity = self.simulation.warehouse[item]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO warehouse (item, time, quantity) VALUES (?, ?, ?)", (item, time, quantity))
+        else:
+            self.connection.execute("DELETE FROM warehouse WHERE item = ?", (item,))
+        self.changed()
+
+    def on_operation(self, action, data, start_time, end_time, door=None):
+        direction = "unload" if action == UNLOAD_ACTION else "load"
+        jobs = self.job_ids[direction]
+        for index, (job, row_id) in enumerate(jobs):
+            if job == data:
+                self.connection.execute("DELETE FROM active_jobs WHERE id = ?", (row_id,))
+                del jobs[index]
+                break
+        self.connection.execute(
+            "INSERT INTO history (action, plate, time_arrived, item, quantity, start_time, end_time, door, "
+            "start_ts, end_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self.history_row(action, *data, start_time, end_time, door))
+        if self.max_duration is not None:
+            self.max_duration = max(self.max_duration, int(end_time) - int(start_time))
+        self.changed()
+
+    @staticmethod
+    def history_row(action, plate, time_arrived, item, quantity, start_time, end_time, door=None):
+        return (action, plate, int(time_arrived), item, quantity, storage.format_time(start_time),
+                storage.format_time(end_time), door, int(start_time), int(end_time))
+
+    def changed(self):
+        self.changes += 1
+        if self.changes >= self.commit_every and not self.batching:
+            self.flush()
+
+    def flush(self):
+        self.connection.commit()
+        self.changes = 0
+
+    # Изменения внутри блока фиксируются одной транзакцией при выходе из него.
+    @contextmanager
+    def batch(self):
+        self.batching += 1
+        try:
+            yield
+        finally:
+            self.batching -= 1
+            if not self.batching:
+                self.flush()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    """Запросы к истории"""
+    def longest_operation(self):
+        if self.max_duration is None:
+            row = self.connection.execute("SELECT MAX(end_ts - start_ts) FROM history").fetchone()
+            self.max_duration = row[0] or 0
+        return self.max_duration
+
+    # Операции, пересекающиеся с окном [start_time, end_time] (секунды эпохи). Раньше
+    # start_time - самая долгая операция пересечений нет, так что индекс читается только по окну.
+    def history_between(self, start_time, end_time):
+        rows = self.connection.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM history "
+            "WHERE start_ts BETWEEN ? AND ? AND end_ts >= ? ORDER BY start_ts",
+            (start_time - self.longest_operation(), end_time, start_time))
+        return [history_record(row) for row in rows]
+
+    # Для диаграммы и показателей — под именем, как у HistoryArchive.
+    records_between = history_between
+
+    def time_range(self):
+        first_start, last_end = self.connection.execute("SELECT MIN(start_ts), MAX(end_ts) FROM history").fetchone()
+        if first_start is None:
+            return None
+        return first_start, last_end
+
+    # (id последней строки, записи после after_id) — доигрывание после снимка показателей.
+    def history_after(self, after_id):
+        rows = self.connection.execute(
+            f"SELECT id, {HISTORY_COLUMNS} FROM history WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+        last_id = rows[-1][0] if rows else after_id
+        return last_id, [history_record(row[1:]) for row in rows]
+
+    """Снимок показателей"""
+    # (id последней учтенной строки истории, состояние KPIEngine.state) или (0, None).
+    def read_kpi_checkpoint(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'kpi'").fetchone()
+        if row is None:
+            return 0, None
+        checkpoint = json.loads(row[0])
+        return checkpoint["last_id"], checkpoint["state"]
+
+    # Снимок на момент последней записанной строки истории: state должен учитывать все строки.
+    def write_kpi_checkpoint(self, state):
+        self.flush()
+        last_id = self.connection.execute("SELECT MAX(id) FROM history").fetchone()[0] or 0
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('kpi', ?)",
+                                    (json.dumps({"last_id": last_id, "state": state}, ensure_ascii=False),))
+
+    def history_for_plate(self, plate):
+        rows = self.connection.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM history WHERE plate = ? ORDER BY start_ts", (plate,))
+        return [history_record(row) for row in rows]
+
+    def history_for_item(self, item, start_time=0, end_time=float("inf")):
+        rows = self.connection.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM history "
+            "WHERE item = ? AND start_ts BETWEEN ? AND ? ORDER BY start_ts", (item, start_time, end_time))
+        return [history_record(row) for row in rows]
+
+    def queue_for_plate(self, plate):
+        return self.connection.execute(
+            "SELECT direction, plate, time_arrived, item, quantity FROM queue WHERE plate = ? ORDER BY id",
+            (plate,)).fetchall()
+
+
+if __name__ == "__main__":
+    # python sqlite_storage.py [база] — переносит текущие текстовые файлы в базу
+    database = SQLiteStorage(sys.argv[1] if len(sys.argv) > 1 else DATABASE_FILE)
+    database.import_text_files()
+    database.close()
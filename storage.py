@@ -0,0 +1,230 @@
+"""Работа с текстовыми файлами состояния"""
+import math
+from functools import lru_cache
+
+from timeutil import SECONDS_PER_DAY, ClockSequence, clock_seconds, format_clock, now, parse_time
+
+UNLOAD_FILE = "unload_queue.txt"
+LOAD_FILE = "load_queue.txt"
+WAREHOUSE_FILE = "warehouse.txt"
+UNLOAD_TIMES_FILE = "unload_times.txt"
+LOAD_TIMES_FILE = "load_times.txt"
+HISTORY_FILE = "history_of_actions.txt"
+
+# Разделитель полей и переводы строк нельзя пускать в номер и товар:
+# файлы очередей и журнал — текст с полями через ";"
+RESERVED_CHARACTERS = (";", "\n", "\r")
+
+# Сборный груз: товары одной машины пишутся в поле товара строкой
+# "Товар 1=5|Товар 2=3", а в поле количества — их сумма.
+LINE_SEPARATOR = "|"
+QUANTITY_SEPARATOR = "="
+
+
+def has_reserved_characters(value):
+    return any(character in value for character in RESERVED_CHARACTERS)
+
+
+"""Сборный груз"""
+def is_manifest(item):
+    return QUANTITY_SEPARATOR in item
+
+
+@lru_cache(maxsize=4096)
+def parse_manifest(item):
+    lines = []
+    for line in item.split(LINE_SEPARATOR):
+        name, _, quantity = line.rpartition(QUANTITY_SEPARATOR)
+        name = name.strip()
+        if not name:
+            raise ValueError(f"неверная строка сборного груза {line!r}")
+        lines.append((name, int(quantity)))
+    return tuple(lines)
+
+
+# Строки (товар, количество) -> (поле товара, общее количество). Одинаковые товары
+# складываются, пустые строки отбрасываются, один товар пишется без количества.
+def format_manifest(lines):
+    merged = {}
+    for name, quantity in lines:
+        if quantity > 0:
+            merged[name] = merged.get(name, 0) + quantity
+    if not merged:
+        raise ValueError("в сборном грузе нет товаров")
+    if len(merged) == 1:
+        [(name, quantity)] = merged.items()
+        return name, quantity
+    item = LINE_SEPARATOR.join(f"{name}{QUANTITY_SEPARATOR}{quantity}" for name, quantity in merged.items())
+    return item, sum(merged.values())
+
+
+# Строки груза машины; у обычной машины — один товар.
+def item_lines(item, quantity):
+    return parse_manifest(item) if is_manifest(item) else ((item, quantity),)
+
+
+# Набор товаров машины без количеств — ключ корзины очереди: оценка товара
+# для приоритета зависит только от него, поэтому сборные грузы с одинаковым
+# составом делят одну корзину.
+@lru_cache(maxsize=4096)
+def item_key(item):
+    if not is_manifest(item):
+        return item
+    return tuple(sorted({name for name, _ in parse_manifest(item)}))
+
+
+# Товары по полю товара или по ключу item_key.
+def item_names(item):
+    if isinstance(item, tuple):
+        return item
+    return item_key(item) if is_manifest(item) else (item,)
+
+
+# Поле товара для показа в таблицах.
+def describe_item(item):
+    if not is_manifest(item):
+        return item
+    return ", ".join(f"{name} ×{quantity}" for name, quantity in parse_manifest(item))
+
+
+def read_from_file(filename, is_warehouse=False):
+    data = []
+    try:
+        with open(filename, "r", encoding='utf-8') as f:
+            for line in f:
+                parts = line.strip().split(";")
+                if len(parts) == 4 and not is_warehouse:
+                    data.append((parts[0], parts[1], parts[2], int(parts[3])))
+                elif len(parts) == 3 and is_warehouse:
+                    data.append((parts[0], parts[1], int(parts[2])))
+    except FileNotFoundError:
+        pass
+    return data
+
+
+def read_times_from_file(filename):
+    times = []
+    try:
+        with open(filename, "r", encoding='utf-8') as f:
+            for line in f:
+                parts = line.strip().split(";")
+                if len(parts) == 2:
+                    times.append((parts[0], parts[1]))
+    except FileNotFoundError:
+        pass
+    return times
+
+
+# Время в файлах — "%H:%M:%S"; внутри модели оно хранится секундами эпохи.
+def format_time(value):
+    return value if isinstance(value, str) else format_clock(value)
+
+
+def format_task(task):
+    plate, time_arrived, item, quantity = task
+    return plate, format_time(time_arrived), item, quantity
+
+
+def parse_task(task, reference=None):
+    plate, time_arrived, item, quantity = task
+    return plate, parse_time(time_arrived, reference), item, int(quantity)
+
+
+def read_queue_from_file(filename, reference=None):
+    return [parse_task(task, reference) for task in read_from_file(filename)]
+
+
+def write_queue_to_file(filename, tasks):
+    write_to_file(filename, (format_task(task) for task in tasks))
+
+
+def read_warehouse_from_file(filename, reference=None):
+    warehouse = {}
+    for time, item, quantity in read_from_file(filename, is_warehouse=True):
+        time = parse_time(time, reference)
+        if item in warehouse:
+            prev_time, prev_quantity = warehouse[item]
+            warehouse[item] = (prev_time, prev_quantity + quantity)
+        else:
+            warehouse[item] = (time, quantity)
+    return warehouse
+
+
+def write_to_file(filename, data):
+    with open(filename, "w", encoding='utf-8') as f:
+        for record in data:
+            f.write(";".join(map(str, record)) + "\n")
+
+
+def save_times_to_file(filename, times):
+    with open(filename, "w", encoding='utf-8') as f:
+        for record in times:
+            f.write(";".join(map(str, record)) + "\n")
+
+
+def write_warehouse_to_file(filename, warehouse):
+    warehouse_data = [
+        (format_time(time), item, quantity) for item, (time, quantity) in warehouse.items()
+    ]
+    write_to_file(filename, warehouse_data)
+
+
+def read_history_from_file(filename=HISTORY_FILE):
+    data = []
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            parts = line.strip().split(';')
+            data.append(tuple(parts))
+    return data
+
+
+def format_history_record(action, data, start_time, end_time, door=None):
+    # Пост пишется восьмым полем; старые записи без него остаются читаемыми
+    suffix = f";{door}" if door else ""
+    data = format_task(data)
+    return f"{action};{';'.join(map(str, data))};{format_time(start_time)};{format_time(end_time)}{suffix}\n"
+
+
+# Строка истории из файла во внутреннюю запись
+# (action, plate, arrival, item, quantity, start, end, door) со временем в секундах эпохи.
+# Даты в файле нет, поэтому время восстанавливается по предыдущим строкам через sequence.
+def parse_history_record(parts, sequence):
+    if len(parts) not in (7, 8):
+        return None
+    action, plate, time_arrived, item, quantity, start_time, end_time = parts[:7]
+    try:
+        start = sequence.parse(start_time)
+        clock = clock_seconds(start_time)
+        # Конец — не раньше начала, прибытие — не позже, оба в пределах суток
+        end = start + (clock_seconds(end_time) - clock) % SECONDS_PER_DAY
+        arrival = start - (clock - clock_seconds(time_arrived)) % SECONDS_PER_DAY
+        quantity = int(quantity)
+    except ValueError:
+        return None
+    return action, plate, arrival, item, quantity, start, end, parts[7] if len(parts) == 8 else None
+
+
+# История за несколько суток: последняя операция должна закончиться не позже reference,
+# поэтому вся последовательность сдвигается на целые сутки назад.
+def shift_into_past(records, reference=None):
+    if not records:
+        return records
+    if reference is None:
+        reference = now()
+    latest = max(record[6] for record in records)
+    days = math.ceil((latest - reference) / SECONDS_PER_DAY)
+    if days <= 0:
+        return records
+    shift = days * SECONDS_PER_DAY
+    return [(action, plate, arrival - shift, item, quantity, start - shift, end - shift, door)
+            for action, plate, arrival, item, quantity, start, end, door in records]
+
+
+def read_history_records(filename=HISTORY_FILE, reference=None):
+    sequence = ClockSequence(reference)
+    records = []
+    for parts in read_history_from_file(filename):
+        record = parse_history_record(parts, sequence)
+        if record is not None:
+            records.append(record)
+    return shift_into_past(records, reference)
@@ -0,0 +1,80 @@
+from itertools import islice
+
+PAGE_SIZE = 200
+MORE_IID = "__more__"
+
+
+class TableView:
+    """Согласованное обновление ttk.Treeview без полной перерисовки.
+
+    Каждая строка имеет постоянный ключ (номер машины в очереди или товар
+    на складе), поэтому при обновлении вставляются, переносятся, меняются
+    и удаляются только отличающиеся строки. В таблице показываются первые
+    ``limit`` строк; остальные подгружаются страницами, когда таблицу
+    прокручивают до конца.
+
+    ``source()`` возвращает общее число строк и итератор пар
+    ``(ключ, значения)``; номер строки добавляется первой колонкой.
+    """
+
+    def __init__(self, table, source, page_size=PAGE_SIZE):
+        self.table = table
+        self.source = source
+        self.page_size = page_size
+        self.limit = page_size
+
+        self.values = {}  # iid -> значения строки в таблице
+        self.hidden = 0
+
+        self.table.configure(yscrollcommand=self.on_scroll)
+
+    def refresh(self):
+        total, rows = self.source()
+        if total <= self.limit - self.page_size:
+            # Очередь сократилась — лишние страницы больше не держим
+            self.limit = max(self.page_size, total)
+
+        visible = []
+        for index, (key, values) in enumerate(islice(rows, self.limit)):
+            visible.append((str(key), (index + 1, *values)))
+
+        table = self.table
+        keys = {iid for iid, _ in visible}
+        stale = [iid for iid in self.values if iid not in keys]
+        if stale:
+            table.delete(*stale)
+            for iid in stale:
+                del self.values[iid]
+
+        children = [iid for iid in table.get_children() if iid != MORE_IID]
+        for index, (iid, values) in enumerate(visible):
+            if iid not in self.values:
+                table.insert("", index, iid=iid, values=values)
+                children.insert(index, iid)
+            else:
+                if children[index] != iid:
+                    table.move(iid, "", index)
+                    children.remove(iid)
+                    children.insert(index, iid)
+                if self.values[iid] != values:
+                    table.item(iid, values=values)
+            self.values[iid] = values
+
+        self.update_more_row(total - len(visible))
+
+    def update_more_row(self, hidden):
+        if hidden == self.hidden:
+            return
+        self.hidden = hidden
+        if not hidden:
+            self.table.delete(MORE_IID)
+        elif self.table.exists(MORE_IID):
+            self.table.item(MORE_IID, values=("…", f"ещё {hidden}"))
+        else:
+            self.table.insert("", "end", iid=MORE_IID, values=("…", f"ещё {hidden}"))
+
+    # Прокрутка до конца таблицы подгружает следующую страницу.
+    def on_scroll(self, first, last):
+        if self.hidden and float(last) >= 1.0:
+            self.limit += self.page_size
+            self.refresh()
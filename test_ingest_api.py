@@ -0,0 +1,52 @@
+"""Проверка времени прибытия в пакетах локального API.
+
+Нечисловые, бесконечные и слишком далекие от текущего момента значения
+time_arrived отклоняют пакет с ответом 400 и не попадают в очереди.
+
+    python -m pytest test_ingest_api.py
+    python test_ingest_api.py
+"""
+import asyncio
+import unittest
+
+import timeutil
+from ingest_api import IngestError, IngestServer, IngestService
+from simulation import CrossDockSimulation
+
+NOW = 1_700_000_000
+
+
+def truck(time_arrived):
+    return {"plate": "А001ВС", "item": "Товар 1", "quantity": 3, "time_arrived": time_arrived}
+
+
+class TimeArrivedTest(unittest.TestCase):
+    def setUp(self):
+        self.simulation = CrossDockSimulation(now=NOW)
+        self.service = IngestService(self.simulation, clock=lambda: NOW)
+
+    def test_rejects_out_of_range(self):
+        for value in (float("nan"), float("inf"), float("-inf"), 1e18, -1e18,
+                      NOW + timeutil.MAX_ARRIVAL_SKEW + 1, NOW - timeutil.MAX_ARRIVAL_SKEW - 1):
+            with self.subTest(value=value), self.assertRaises(IngestError):
+                self.service.enqueue("unload", [truck(value)])
+        self.assertEqual(len(self.simulation.unload_queue), 0)
+
+    def test_accepts_recent(self):
+        self.assertEqual(self.service.enqueue("unload", [truck(NOW - 3600), {"plate": "В002ОР",
+                                                                               "item": "Товар 2", "quantity": 1}]), 2)
+        self.assertEqual(sorted(task[1] for task in self.simulation.unload_queue), [NOW - 3600, NOW])
+
+    def test_route_answers_400(self):
+        server = IngestServer(self.service)
+        for body in (b'[{"plate": "A1", "item": "x", "quantity": 1, "time_arrived": NaN}]',
+                     b'[{"plate": "A1", "item": "x", "quantity": 1, "time_arrived": Infinity}]',
+                     b'[{"plate": "A1", "item": "x", "quantity": 1, "time_arrived": 1e18}]'):
+            with self.subTest(body=body):
+                status, _ = asyncio.run(server.route("POST", "/load", body))
+                self.assertEqual(status, 400)
+        self.assertEqual(len(self.simulation.load_queue), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
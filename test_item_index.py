@@ -0,0 +1,72 @@
+"""Проверка ItemIndex против прямого прохода по очереди загрузки.
+
+Случайная последовательность постановок, выборов, удалений и очисток;
+после каждого шага индекс сравнивается с полным перебором очереди.
+
+    python -m pytest test_item_index.py
+    python test_item_index.py
+"""
+import random
+import unittest
+
+import storage
+from dispatch_queue import DispatchQueue
+from item_index import ItemIndex
+
+ITEMS = ["Товар 1", "Товар 2", "Товар 3", "Товар 4"]
+STEPS = 3000
+
+
+# Прежний линейный расчет: длина очереди минус позиция первой машины с товаром.
+def needed_for_load(queue, item):
+    tasks = list(queue)
+    for position, task in enumerate(tasks):
+        if item in storage.item_names(task[2]):
+            return len(tasks) - position
+    return 0
+
+
+def random_task(rng, number):
+    if rng.random() < 0.3:
+        lines = [(item, rng.randint(1, 9)) for item in rng.sample(ITEMS, rng.randint(2, 3))]
+        item, quantity = storage.format_manifest(lines)
+    else:
+        item, quantity = rng.choice(ITEMS), rng.randint(1, 9)
+    return f"А{number % 50:03d}ВС", rng.randint(0, 10000), item, quantity
+
+
+class ItemIndexTest(unittest.TestCase):
+    def check(self, queue, index):
+        for item in ITEMS:
+            self.assertEqual(index.needed_for_load(item), needed_for_load(queue, item), item)
+
+    def test_matches_linear_scan(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            queue = DispatchQueue(lambda item: rng.random(), waiting_weight=1.0)
+            index = ItemIndex(queue)
+            for step in range(STEPS):
+                action = rng.random()
+                if action < 0.5 or not queue:
+                    queue.push(random_task(rng, step))
+                elif action < 0.75:
+                    queue.pop()
+                elif action < 0.9:
+                    queue.discard(rng.choice(list(queue)))
+                elif action < 0.99:
+                    queue.remove(rng.choice(list(queue))[0])
+                else:
+                    queue.clear()
+                self.check(queue, index)
+
+    def test_built_from_filled_queue(self):
+        rng = random.Random(42)
+        queue = DispatchQueue(lambda item: 0.0)
+        queue.extend(random_task(rng, number) for number in range(200))
+        for _ in range(50):
+            queue.pop()
+        self.check(queue, ItemIndex(queue))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import math
+
+import timeutil
+
+
+class TimerService:
+    """Таймер Tk на ближайшее событие симуляции вместо ежесекундного опроса.
+
+    Держит ровно один ``after`` на время следующего события (обычно конец
+    работы на посту). Когда он срабатывает, симуляция сдвигается на
+    текущее время, свободные посты получают машины, а ``on_change``
+    вызывается только если что-то действительно произошло. Пока событий
+    нет, таймер не взведен.
+    """
+
+    def __init__(self, widget, simulation, on_change, clock=timeutil.now):
+        self.widget = widget
+        self.simulation = simulation
+        self.on_change = on_change
+        self.clock = clock
+
+        self.after_id = None
+        self.due = None
+
+    def schedule(self):
+        due = self.simulation.next_event_time()
+        if due == self.due and self.after_id is not None:
+            return
+        self.cancel()
+        if due is None:
+            return
+        delay = max(0, math.ceil((due - self.clock()) * 1000))
+        self.due = due
+        self.after_id = self.widget.after(delay, self.fire)
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+        self.after_id = None
+        self.due = None
+
+    def fire(self):
+        self.after_id = None
+        self.due = None
+        if self.simulation.advance_to(self.clock()):
+            self.on_change()
+        self.schedule()
+
+    # Вызывается после внешних изменений (новая машина, ручной запуск поста).
+    def wake(self):
+        self.simulation.advance_to(self.clock())
+        self.simulation.dispatch()
+        self.on_change()
+        self.schedule()
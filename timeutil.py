@@ -0,0 +1,104 @@
+"""Время внутри модели — секунды эпохи Unix.
+
+Строки "%H:%M:%S" встречаются только на границах: в текстовых файлах и
+в отображении. Разбор строки кешируется, а дата к ней подбирается по
+опорному моменту, поэтому операции корректно переходят через полночь.
+"""
+import math
+import time
+from datetime import datetime
+from functools import lru_cache
+
+TIME_FORMAT = "%H:%M:%S"
+SECONDS_PER_DAY = 24 * 60 * 60
+HALF_DAY = SECONDS_PER_DAY // 2
+MAX_ARRIVAL_SKEW = 366 * SECONDS_PER_DAY  # время прибытия извне — не дальше года от текущего
+
+
+def now():
+    return time.time()
+
+
+# "%H:%M:%S" -> секунды от начала суток; разбирается вручную, strptime здесь в десятки раз медленнее.
+@lru_cache(maxsize=None)
+def clock_seconds(value):
+    parts = value.split(":")
+    if len(parts) != 3:
+        raise ValueError(f"time data {value!r} does not match format {TIME_FORMAT!r}")
+    hours, minutes, seconds = map(int, parts)
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"time data {value!r} does not match format {TIME_FORMAT!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_clock(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime(TIME_FORMAT)
+
+
+def local_midnight(timestamp):
+    moment = datetime.fromtimestamp(timestamp)
+    return datetime.combine(moment.date(), datetime.min.time()).timestamp()
+
+
+# Момент с показанием часов value, ближайший к anchor.
+def clock_near(value, anchor, midnight=None):
+    if midnight is None:
+        midnight = local_midnight(anchor)
+    timestamp = midnight + clock_seconds(value)
+    if timestamp - anchor > HALF_DAY:
+        timestamp -= SECONDS_PER_DAY
+    elif anchor - timestamp > HALF_DAY:
+        timestamp += SECONDS_PER_DAY
+    return int(timestamp)
+
+
+# Последний момент не позже reference с показанием часов value.
+def parse_clock(value, reference=None):
+    if reference is None:
+        reference = now()
+    timestamp = clock_near(value, reference)
+    if timestamp > reference:
+        timestamp -= SECONDS_PER_DAY
+    return timestamp
+
+
+# Значение из файла: секунды эпохи или старое "%H:%M:%S".
+def parse_time(value, reference=None):
+    if isinstance(value, (int, float)):
+        return value
+    if ":" in value:
+        return parse_clock(value, reference)
+    return float(value) if "." in value else int(value)
+
+
+# Время прибытия из внешнего источника: конечное число секунд не дальше
+# MAX_ARRIVAL_SKEW от reference, иначе ValueError.
+def check_arrival(value, reference):
+    if not math.isfinite(value) or abs(value - reference) > MAX_ARRIVAL_SKEW:
+        raise ValueError(f"время прибытия {value!r} вне допустимого диапазона")
+    return int(value)
+
+
+class ClockSequence:
+    """Разбор идущих подряд показаний часов (строк истории) с переходом через полночь.
+
+    Первое показание привязывается к последнему подходящему моменту не
+    позже ``reference``, каждое следующее — к ближайшему от предыдущего.
+    Полночь суток предыдущего показания запоминается, поэтому длинная
+    история разбирается без перевода каждой строки в дату.
+    """
+
+    def __init__(self, reference=None):
+        self.reference = reference
+        self.anchor = None
+        self.midnight = None
+
+    def parse(self, value):
+        if self.anchor is None:
+            timestamp = parse_clock(value, self.reference)
+        else:
+            timestamp = clock_near(value, self.anchor, self.midnight)
+        self.anchor = timestamp
+        if self.midnight is None or not self.midnight <= timestamp < self.midnight + SECONDS_PER_DAY:
+            self.midnight = local_midnight(timestamp)
+        return timestamp
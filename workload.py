@@ -0,0 +1,115 @@
+"""Генератор синтетической нагрузки в форматах файлов проекта.
+
+Поток машин задается зерном, поэтому один и тот же набор параметров
+всегда дает одинаковые очереди и историю — от тысячи до миллиона
+прибытий. Используется бенчмарками и прогоном сценариев.
+
+    python workload.py --trucks 100000 --seed 1 --output bench_data
+    python workload.py --trucks 1000000 --manifest arrivals.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import random
+
+import storage
+from simulation import LOAD_ACTION, UNLOAD_ACTION
+
+ITEMS = ["Товар 1", "Товар 2", "Товар 3"]
+MAX_QUANTITY = 30
+
+
+def plate_for(task_type, number):
+    return f"{'L' if task_type == 'load' else 'U'}{number:07d}"
+
+
+# Пуассоновский поток машин: (время, тип, машина). Товары и объемы — равномерно.
+def iter_arrivals(rng, trucks, interarrival, load_share, items=ITEMS, max_quantity=MAX_QUANTITY, start=0):
+    time = start
+    for number in range(trucks):
+        time += rng.expovariate(1.0 / interarrival)
+        task_type = "load" if rng.random() < load_share else "unload"
+        car_data = (plate_for(task_type, number), int(time), rng.choice(items), rng.randint(1, max_quantity))
+        yield time, task_type, car_data
+
+
+def generate_arrivals(rng, trucks, interarrival, load_share, items=ITEMS, max_quantity=MAX_QUANTITY, start=0):
+    return list(iter_arrivals(rng, trucks, interarrival, load_share, items, max_quantity, start))
+
+
+# Очереди: все машины уже стоят на терминале к моменту start + их время прибытия.
+def generate_queues(seed, trucks, interarrival=1.0, load_share=0.5, items=ITEMS, start=0):
+    unload, load = [], []
+    for _, task_type, car_data in generate_arrivals(random.Random(seed), trucks, interarrival, load_share,
+                                                    items, start=start):
+        (load if task_type == "load" else unload).append(car_data)
+    return unload, load
+
+
+# История операций: посты работают без простоев, по одной машине за раз.
+def generate_history(seed, records, items=ITEMS, unload_doors=1, load_doors=1, start=0):
+    rng = random.Random(seed)
+    door_free = {("unload", number): start for number in range(1, unload_doors + 1)}
+    door_free.update({("load", number): start for number in range(1, load_doors + 1)})
+    doors = list(door_free)
+    for number in range(records):
+        task_type, door_number = doors[number % len(doors)]
+        begin = door_free[(task_type, door_number)]
+        end = begin + rng.randint(2, 90)
+        door_free[(task_type, door_number)] = end
+        car_data = (plate_for(task_type, number), begin - rng.randint(0, 3600), rng.choice(items),
+                    rng.randint(1, MAX_QUANTITY))
+        action = LOAD_ACTION if task_type == "load" else UNLOAD_ACTION
+        door = f"Пост {'загрузки' if task_type == 'load' else 'разгрузки'} {door_number}"
+        yield action, car_data, begin, end, door
+
+
+# Манифест прибытия для manifest_import: JSONL или CSV по расширению файла.
+def write_manifest(filename, seed, trucks, interarrival=1.0, load_share=0.5, start=0):
+    arrivals = iter_arrivals(random.Random(seed), trucks, interarrival, load_share, start=start)
+    with open(filename, "w", encoding='utf-8', newline="") as f:
+        if filename.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(("direction", "plate", "time_arrived", "item", "quantity"))
+            for _, task_type, car_data in arrivals:
+                writer.writerow((task_type, *car_data))
+            return
+        for _, task_type, (plate, time_arrived, item, quantity) in arrivals:
+            f.write(json.dumps({"direction": task_type, "plate": plate, "time_arrived": time_arrived,
+                                "item": item, "quantity": quantity}, ensure_ascii=False) + "\n")
+
+
+def write_history(filename, records):
+    with open(filename, "w", encoding='utf-8') as f:
+        for record in records:
+            f.write(storage.format_history_record(*record))
+
+
+# Полный набор файлов проекта в каталоге output.
+def write_workload(output, seed, trucks, history_records=None, start=0):
+    os.makedirs(output, exist_ok=True)
+    unload, load = generate_queues(seed, trucks, start=start)
+    storage.write_queue_to_file(os.path.join(output, storage.UNLOAD_FILE), unload)
+    storage.write_queue_to_file(os.path.join(output, storage.LOAD_FILE), load)
+    storage.write_warehouse_to_file(os.path.join(output, storage.WAREHOUSE_FILE), {})
+    storage.save_times_to_file(os.path.join(output, storage.UNLOAD_TIMES_FILE),
+                               [(item, index + 1) for index, item in enumerate(ITEMS)])
+    storage.save_times_to_file(os.path.join(output, storage.LOAD_TIMES_FILE),
+                               [(item, len(ITEMS) - index) for index, item in enumerate(ITEMS)])
+    history_records = trucks if history_records is None else history_records
+    write_history(os.path.join(output, storage.HISTORY_FILE), generate_history(seed, history_records, start=start))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация синтетической нагрузки кросс-докинга")
+    parser.add_argument("--trucks", type=int, default=1000, help="число машин в очередях")
+    parser.add_argument("--history", type=int, default=None, help="строк истории (по умолчанию как машин)")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора")
+    parser.add_argument("--output", default="workload", help="каталог для файлов")
+    parser.add_argument("--manifest", help="вместо файлов состояния записать манифест прибытия (.jsonl или .csv)")
+    args = parser.parse_args()
+    if args.manifest:
+        write_manifest(args.manifest, args.seed, args.trucks)
+    else:
+        write_workload(args.output, args.seed, args.trucks, args.history)